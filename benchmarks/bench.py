@@ -0,0 +1,243 @@
+"""
+Benchmarks for the frame extraction and dedupe hot paths.
+
+Generates deterministic synthetic videos with ffmpeg's lavfi `testsrc` (with injected runs of
+frozen, duplicate frames), times each operation in a fresh process and writes the results as
+JSON so runs can be compared:
+
+    python benchmarks/bench.py --output before.json
+    python benchmarks/bench.py --output after.json --compare before.json
+
+Every result records wall time, frames per second, peak RSS of the Python process and of its
+ffmpeg children, and the number of subprocesses started.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# (name, width, height, seconds)
+VIDEOS = [
+    ("240p_10s", 320, 240, 10),
+    ("720p_10s", 1280, 720, 10),
+    ("1080p_30s", 1920, 1080, 30),
+]
+QUICK_VIDEOS = VIDEOS[:1]
+VIDEO_FPS = 30
+# Frames [first, last] replaced by a copy of `first`, giving runs of duplicates to detect
+FROZEN_RANGES = [(30, 59), (120, 134), (200, 203)]
+
+
+def generate_video(path, width, height, seconds):
+    # freezeframes takes the frame to repeat from a second input, fed from a split of the first
+    chains = []
+    for i, (first, last) in enumerate(FROZEN_RANGES):
+        source = "0:v" if i == 0 else f"v{i}"
+        chains.append(f"[{source}]split[a{i}][b{i}];[a{i}][b{i}]freezeframes=first={first}:last={last}:replace={first}[v{i + 1}]")
+    command = [
+        "ffmpeg",
+        "-y",
+        "-loglevel",
+        "error",
+        "-f",
+        "lavfi",
+        "-i",
+        f"testsrc=size={width}x{height}:rate={VIDEO_FPS}:duration={seconds}",
+        "-filter_complex",
+        ";".join(chains),
+        "-map",
+        f"[v{len(FROZEN_RANGES)}]",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-g",
+        str(VIDEO_FPS * 2),
+        "-pix_fmt",
+        "yuv420p",
+        path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def bench_rip_frames(video_path, work_dir):
+    from fripper.ffmpeg_cmd import rip_frames
+    rip_frames(video_path, work_dir, "frame_%05d.jpg", fps=VIDEO_FPS)
+    return len(os.listdir(work_dir))
+
+
+def bench_stream_frames(video_path, work_dir):
+    from fripper.ffmpeg_cmd import stream_frames, get_video_dimensions
+    return sum(1 for _ in stream_frames(video_path, fps=VIDEO_FPS, size=get_video_dimensions(video_path)))
+
+
+def bench_grab_frame(video_path, work_dir):
+    from fripper.ffmpeg_cmd import grab_frame
+    for timestamp in ("00:00:01.000", "00:00:03.000", "00:00:05.000", "00:00:07.000"):
+        grab_frame(video_path, timestamp, work_dir)
+    return 4
+
+
+def bench_grab_thumbnails(video_path, work_dir):
+    from fripper.ffmpeg_cmd import grab_thumbnails
+    return len(grab_thumbnails(video_path, work_dir))
+
+
+def bench_get_clip(video_path, work_dir):
+    from fripper.ffmpeg_cmd import get_clip
+    if not get_clip(video_path, "00:00:05.000", "00:00:07.000", work_dir):
+        raise RuntimeError("get_clip failed")
+    return 2 * VIDEO_FPS
+
+
+def bench_get_duplicate_frames(video_path, work_dir):
+    from fripper.deduper import get_duplicate_frames
+    get_duplicate_frames(video_path)
+    return count_frames(video_path)
+
+
+def bench_get_duplicate_frames_batched(video_path, work_dir):
+    from fripper.deduper import get_duplicate_frames_batched
+    get_duplicate_frames_batched(video_path)
+    return count_frames(video_path)
+
+
+def bench_dedupe_video(video_path, work_dir):
+    from fripper.deduper import dedupe_video
+    written, removed = dedupe_video(video_path, os.path.join(work_dir, "output.mkv"))
+    return written + removed
+
+
+BENCHMARKS = {
+    "rip_frames": bench_rip_frames,
+    "stream_frames": bench_stream_frames,
+    "grab_frame": bench_grab_frame,
+    "grab_thumbnails": bench_grab_thumbnails,
+    "get_clip": bench_get_clip,
+    "get_duplicate_frames": bench_get_duplicate_frames,
+    "get_duplicate_frames_batched": bench_get_duplicate_frames_batched,
+    "dedupe_video": bench_dedupe_video,
+}
+
+
+def count_frames(video_path):
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+
+def _max_rss_mb(who):
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+
+def _run_in_child(name, video_path, results):
+    # Count every subprocess the operation starts
+    spawned = [0]
+    original_popen = subprocess.Popen
+
+    class CountingPopen(original_popen):
+        def __init__(self, *args, **kwargs):
+            spawned[0] += 1
+            super().__init__(*args, **kwargs)
+
+    subprocess.Popen = CountingPopen
+
+    # Silence the operation and the ffmpeg processes it starts, results go through the queue
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    os.dup2(devnull, 2)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        try:
+            start = time.perf_counter()
+            frames = BENCHMARKS[name](video_path, work_dir)
+            wall = time.perf_counter() - start
+            results.put({
+                "wall_s": wall,
+                "frames": frames,
+                "fps": frames / wall if wall else None,
+                "peak_rss_mb": _max_rss_mb(resource.RUSAGE_SELF),
+                "peak_child_rss_mb": _max_rss_mb(resource.RUSAGE_CHILDREN),
+                "subprocesses": spawned[0],
+            })
+        except Exception as e:
+            results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def run_benchmark(name, video_path):
+    # A fresh process per run so peak RSS and imports are not shared between operations
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_in_child, args=(name, video_path, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def compare(results, baseline):
+    print(f"\n{'benchmark':<50} {'before':>10} {'after':>10} {'change':>8}")
+    for key, result in results.items():
+        before = baseline.get(key, {}).get("wall_s")
+        after = result.get("wall_s")
+        if before is None or after is None:
+            continue
+        print(f"{key:<50} {before:>9.3f}s {after:>9.3f}s {(after - before) / before:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fripper extraction and dedupe")
+    parser.add_argument("--output", default="bench_results.json", help="Path to write the JSON results to")
+    parser.add_argument("--compare", default=None, help="Previous results to compare wall times against")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks")
+    parser.add_argument("--quick", action="store_true", help="Only use the smallest video")
+    parser.add_argument("--video-dir", default=None, help="Keep generated videos here and reuse them between runs")
+    args = parser.parse_args()
+
+    names = args.only or list(BENCHMARKS)
+    videos = QUICK_VIDEOS if args.quick else VIDEOS
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        video_dir = args.video_dir or temp_dir
+        os.makedirs(video_dir, exist_ok=True)
+
+        results = {}
+        for video_name, width, height, seconds in videos:
+            video_path = os.path.join(video_dir, f"bench_{video_name}.mp4")
+            if not os.path.exists(video_path):
+                generate_video(video_path, width, height, seconds)
+
+            for name in names:
+                key = f"{name}[{video_name}]"
+                result = run_benchmark(name, video_path)
+                results[key] = result
+                if "error" in result:
+                    print(f"{key:<50} ERROR {result['error']}")
+                else:
+                    print(f"{key:<50} {result['wall_s']:>8.3f}s {result['fps']:>9.1f} fps "
+                          f"{result['peak_rss_mb']:>7.1f} MB rss {result['peak_child_rss_mb']:>7.1f} MB child "
+                          f"{result['subprocesses']:>3} procs")
+
+    with open(args.output, "w") as f:
+        json.dump({"python": sys.version, "platform": platform.platform(), "results": results}, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)["results"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup benchmark for the fripper CLI.
+
+Scripts call `fripper grab` thousands of times, so the time from starting Python to having
+parsed the arguments matters as much as the ffmpeg run itself. This starts a fresh
+interpreter per run, imports the CLI and parses `fripper grab --help`, and fails when the
+median time goes over the budget or when a heavy module (OpenCV, NumPy, Pillow,
+scikit-image) got imported on the way:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --budget-ms 50 --runs 30 -- grab --help
+
+Times are measured inside the child, so the interpreter's own startup is not counted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+HEAVY_MODULES = ("cv2", "numpy", "PIL", "skimage")
+DEFAULT_BUDGET_MS = 75
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+sys.argv = {argv!r}
+from fripper.__main__ import main
+try:
+    main()
+except SystemExit:
+    pass
+elapsed = time.perf_counter() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+sys.stderr.write(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def measure(argv):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH")])))
+    code = CHILD.format(argv=argv, heavy=HEAVY_MODULES)
+    result = subprocess.run([sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True, text=True)
+    # The child's result is the last line of stderr, anything before it is noise from imports
+    return json.loads(result.stderr.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fripper CLI startup")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Largest allowed median import and parse time")
+    parser.add_argument("--runs", type=int, default=15, help="Number of fresh interpreters to time")
+    parser.add_argument("fripper_args", nargs="*", default=["grab", "--help"], help="Arguments given to fripper, after a --")
+    args = parser.parse_args()
+
+    argv = ["fripper", *args.fripper_args]
+    # One untimed run so the timed ones read the modules from a warm page cache
+    measure(argv)
+    runs = [measure(argv) for _ in range(args.runs)]
+    times = sorted(run["ms"] for run in runs)
+    median = statistics.median(times)
+    heavy = sorted({name for run in runs for name in run["heavy"]})
+
+    print(f"fripper {' '.join(args.fripper_args)}: median {median:.1f} ms, min {times[0]:.1f} ms, max {times[-1]:.1f} ms "
+          f"over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    failed = False
+    if heavy:
+        print(f"Heavy modules imported: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget_ms:
+        print(f"Over budget by {median - args.budget_ms:.1f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,28 @@
 import argparse
+import os
 import sys
-from .splitter import VideoSplitter
-from .preview import preview_frame, preview_thumbnails
-from .ffmpeg_cmd import grab_frame, grab_thumbnails
+from . import trace
+from .ffmpeg_cmd import grab_frame, grab_frames, grab_thumbnails, seconds_to_hms, get_length_of_video, DecoderOptions, HWACCELS
+from .batch import OPERATIONS
+# Modules that pull in cv2, numpy, PIL or skimage are imported by the subcommands that use
+# them, so commands that only run ffmpeg start fast (see benchmarks/startup.py)
+
+def add_decoder_arguments(parser, extraction=False):
+    parser.add_argument("--hwaccel", default=None, choices=HWACCELS, help="Hardware decoder, 'auto' lets ffmpeg pick. cuda and vaapi fall back to software on failure")
+    parser.add_argument("--threads", type=int, default=None, help="Number of ffmpeg decoder and filter threads")
+    if extraction:
+        parser.add_argument("--keyframes-only", action="store_true", help="Decode only keyframes, much faster for skimming long videos")
+
+def decoder_from_args(args, nvidia=False):
+    hwaccel = args.hwaccel or ("cuda" if nvidia else "none")
+    return DecoderOptions(hwaccel, threads=args.threads, keyframes_only=getattr(args, "keyframes_only", False),
+                          height=getattr(args, "height", None))
 
 def main():
     parser = argparse.ArgumentParser(description="Frame analysis tool")
+    parser.add_argument("--trace", default=None, help="Record timings of every ffmpeg/ffprobe process and processing stage to this file. "
+                                                      "A .json file opens in Chrome's trace viewer, anything else is written as JSON lines")
+    parser.add_argument("--trace-format", default=None, choices=trace.FORMATS, help="Trace file format, overrides the file extension")
     subparsers = parser.add_subparsers(dest="command")
 
     # Subcommand for splitting frames
@@ -14,38 +31,140 @@ def main():
     split_parser.add_argument("--fps", default=4, help="Frames per second to extract")
     split_parser.add_argument("--start", default=None, help="Position in video to start split")
     split_parser.add_argument("--nvidia", action="store_true", help="Use NVIDIA hardware acceleration")
+    split_parser.add_argument("--stream", action="store_true", help="Decode every frame into memory before opening the viewer")
+    split_parser.add_argument("--rip", action="store_true", help="Extract every frame as a JPEG to a temp dir before opening the viewer")
+    split_parser.add_argument("--cache-mb", type=float, default=512, help="Only used with --rip: memory limit of the cache of decoded JPEGs in MB. The default on-demand mode keeps frames on disk")
+    split_parser.add_argument("--prefetch", type=int, default=8, help="Only used with --rip: number of JPEGs to decode ahead in the scrubbing direction")
+    split_parser.add_argument("--clip-workers", type=int, default=2, help="Number of clips encoded at the same time")
+    split_parser.add_argument("--copy", action="store_true", help="Cut clips on keyframes with stream copy instead of re-encoding")
+    split_parser.add_argument("--store", action="store_true", help="Keep extracted frames in a persistent frame store so reopening the video is instant")
+    split_parser.add_argument("--scenes", action="store_true", help="Detect scene cuts in the background, n and p jump to the next and previous cut")
+    split_parser.add_argument("--proxy-height", type=int, default=None, help="Show frames scaled to this height. Crops are mapped back to the full resolution video when exporting")
+    add_decoder_arguments(split_parser, extraction=True)
 
     # Subcommand for grabbing frames
     grab_parser = subparsers.add_parser("grab", help="Grab a single frame from a video")
     grab_parser.add_argument("video_path", help="Path to the video")
-    grab_parser.add_argument("--timestamp", default="00:00:00.000", help="Timestamp to extract the frame (format: HH:MM:SS.mmm).")
+    grab_parser.add_argument("--timestamp", nargs="+", default=["00:00:00.000"], help="Timestamp(s) to extract frames at (format: HH:MM:SS.mmm). Several timestamps are grabbed with one ffmpeg process.")
     grab_parser.add_argument("--output-path", default=None, help="Output path of extracted frame")
     grab_parser.add_argument("--thumbnails", action="store_true", help="Grab thumbnails")
+    grab_parser.add_argument("--count", type=int, default=4, help="Number of thumbnails to grab")
+    grab_parser.add_argument("--height", type=int, default=None, help="Scale grabbed frames to this height")
+    add_decoder_arguments(grab_parser)
 
     preview_parser = subparsers.add_parser("preview", help="Preview a single frame of a video")
     preview_parser.add_argument("video_path", help="Path to the video")
     preview_parser.add_argument("--timestamp", default="00:00:00.000", help="Timestamp to extract the frame (format: HH:MM:SS.mmm).")
     preview_parser.add_argument("--thumbnails", action="store_true", help="Display thumbnails")
+    preview_parser.add_argument("--count", type=int, default=4, help="Number of thumbnails to display")
 
-    args = parser.parse_args()
+    clips_parser = subparsers.add_parser("clips", help="Extract a list of clips from a video without the viewer")
+    clips_parser.add_argument("video_path", help="Path to the video")
+    clips_parser.add_argument("jobs_path", help='JSON lines file with one {"start": ..., "end": ..., "crop": [[x1, y1], [x2, y2]]} job per line. '
+                                                'A job with "regions": {"name": [[x1, y1], [x2, y2]], ...} gets one clip per region from a single decode')
+    clips_parser.add_argument("--workers", type=int, default=2, help="Number of clips encoded at the same time")
+    clips_parser.add_argument("--output-dir", default=None, help="Directory to save the clips to")
+    clips_parser.add_argument("--copy", action="store_true", help="Cut clips on keyframes with stream copy instead of re-encoding")
+    add_decoder_arguments(clips_parser)
+
+    index_parser = subparsers.add_parser("index", help="Add perceptual hashes of videos to a near-duplicate search index")
+    index_parser.add_argument("video_paths", nargs="+", help="Paths to the videos to index")
+    index_parser.add_argument("--index", default=None, help="Index directory, defaults to index/ in the fripper cache directory")
+    index_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between sampled frames")
+    index_parser.add_argument("--hash", default="phash", choices=["phash", "dhash"], help="Hash function for a new index")
+    index_parser.add_argument("--force", action="store_true", help="Re-index videos that are already in the index")
+
+    search_parser = subparsers.add_parser("search", help="Find near-duplicate footage of a video or image in the index")
+    search_parser.add_argument("query_path", help="Path to the video or image to look up")
+    search_parser.add_argument("--index", default=None, help="Index directory, defaults to index/ in the fripper cache directory")
+    search_parser.add_argument("--distance", type=int, default=8, help="Maximum Hamming distance of a match (out of 64 bits)")
+    search_parser.add_argument("--interval", type=float, default=1.0, help="Seconds between sampled frames of a query video")
 
+    scenes_parser = subparsers.add_parser("scenes", help="Detect scene cuts (shot boundaries) in a video")
+    scenes_parser.add_argument("video_path", help="Path to the video")
+    scenes_parser.add_argument("--fps", type=float, default=None, help="Sample the video at this rate instead of every frame")
+    scenes_parser.add_argument("--height", type=int, default=None, help="Height frames are compared at, defaults to 144")
+    scenes_parser.add_argument("--sensitivity", type=float, default=6.0, help="Robust standard deviations above the local level of change a cut needs")
+    scenes_parser.add_argument("--min-score", type=float, default=0.15, help="Smallest change (1 - histogram correlation) that can be a cut")
+    scenes_parser.add_argument("--min-scene", type=float, default=0.5, help="Shortest shot in seconds")
+    scenes_parser.add_argument("--jobs", default=None, help="Write one clip job per scene to this JSON lines file for `fripper clips`")
+    add_decoder_arguments(scenes_parser)
+
+    batch_parser = subparsers.add_parser("batch", help="Run thumbnails, dedupe or frame grabs over many videos with a process pool")
+    batch_parser.add_argument("operation", choices=OPERATIONS, help="What to do with every video")
+    batch_parser.add_argument("paths", nargs="+", help="Videos, directories (searched recursively) or glob patterns")
+    batch_parser.add_argument("--output-dir", required=True, help="Directory for the outputs and manifest.json")
+    batch_parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="Number of videos processed at the same time")
+    batch_parser.add_argument("--count", type=int, default=4, help="Number of thumbnails per video")
+    batch_parser.add_argument("--timestamp", nargs="+", default=["00:00:00.000"], help="Timestamps to grab from every video")
+    batch_parser.add_argument("--min-length", type=int, default=10, help="Minimum run of consecutive duplicates to remove")
+    batch_parser.add_argument("--method", choices=["histogram", "ssim"], default="histogram", help="How dedupe compares frames")
+    batch_parser.add_argument("--threshold", type=float, default=None, help="Dedupe threshold, defaults to the method's default")
+    batch_parser.add_argument("--force", action="store_true", help="Process videos even if their outputs are up to date")
+
+    args = parser.parse_args()
+    if args.trace:
+        trace.enable_tracing(args.trace, args.trace_format)
 
     if args.command == "split":
+        from .splitter import VideoSplitter
         if args.nvidia:
             print("Using NVIDIA acceleration")
-        splitter = VideoSplitter(args.video_path, fps=args.fps, start=args.start, nvidia=args.nvidia)
+        splitter = VideoSplitter(args.video_path, fps=args.fps, start=args.start, nvidia=args.nvidia, stream=args.stream,
+                                 cache_mb=args.cache_mb, prefetch=args.prefetch, clip_workers=args.clip_workers, copy=args.copy, store=args.store,
+                                 decoder=decoder_from_args(args, args.nvidia), proxy_height=args.proxy_height, rip=args.rip,
+                                 scenes=args.scenes)
         splitter.setup()
         splitter.run()
     elif args.command == "grab":
+        decoder = decoder_from_args(args)
         if args.thumbnails:
-            grab_thumbnails(args.video_path)
+            grab_thumbnails(args.video_path, args.output_path, args.count, decoder=decoder)
+        elif len(args.timestamp) > 1:
+            grab_frames(args.video_path, args.timestamp, args.output_path, decoder=decoder)
         else:
-            grab_frame(args.video_path, args.timestamp, args.output_path)
+            grab_frame(args.video_path, args.timestamp[0], args.output_path, decoder=decoder)
     elif args.command == "preview":
+        from .preview import preview_frame, preview_thumbnails
         if args.thumbnails:
-            preview_thumbnails(args.video_path)
+            preview_thumbnails(args.video_path, args.count)
         else:
             preview_frame(args.video_path, args.timestamp)
+    elif args.command == "clips":
+        from .jobs import run_clip_jobs
+        if not run_clip_jobs(args.video_path, args.jobs_path, workers=args.workers, output_directory=args.output_dir, copy=args.copy,
+                             decoder=decoder_from_args(args)):
+            sys.exit(1)
+    elif args.command == "scenes":
+        from .scenes import detect_scenes, scene_segments, write_scene_jobs, SCENE_HEIGHT
+        cuts = detect_scenes(args.video_path, fps=args.fps, height=args.height or SCENE_HEIGHT, sensitivity=args.sensitivity,
+                             min_score=args.min_score, min_scene_seconds=args.min_scene, decoder=decoder_from_args(args))
+        for cut in cuts:
+            print(seconds_to_hms(cut))
+        if args.jobs:
+            segments = scene_segments(cuts, get_length_of_video(args.video_path))
+            write_scene_jobs(segments, args.jobs)
+            print(f"{len(segments)} scenes written to {args.jobs}")
+    elif args.command == "batch":
+        from .batch import run_batch
+        if args.operation == "thumbnails":
+            options = {"count": args.count}
+        elif args.operation == "grab":
+            options = {"timestamps": args.timestamp}
+        else:
+            from .deduper import DEFAULT_THRESHOLDS
+            options = {"min_length": args.min_length, "method": args.method,
+                       "threshold": args.threshold if args.threshold is not None else DEFAULT_THRESHOLDS[args.method]}
+        manifest = run_batch(args.operation, args.paths, args.output_dir, workers=args.workers, options=options, force=args.force)
+        if manifest["summary"]["failed"]:
+            sys.exit(1)
+    elif args.command == "index":
+        from .hash_index import index_videos, DEFAULT_INDEX_PATH
+        index_videos(args.video_paths, args.index or DEFAULT_INDEX_PATH, interval=args.interval, method=args.hash, force=args.force)
+    elif args.command == "search":
+        from .hash_index import search_video, DEFAULT_INDEX_PATH
+        for query_timestamp, path, timestamp, distance in search_video(args.query_path, args.index or DEFAULT_INDEX_PATH, args.distance, args.interval):
+            print(f"{seconds_to_hms(query_timestamp)} -> {path} @ {seconds_to_hms(timestamp)} (distance {distance})")
     else:
         print("Invalid command")
         sys.exit(1)
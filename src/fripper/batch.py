@@ -0,0 +1,175 @@
+import glob
+import hashlib
+import json
+import os
+import time
+
+from .ffmpeg_cmd import atomic_write, file_fingerprint
+
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".mov", ".avi", ".webm", ".m4v", ".mpg", ".mpeg", ".wmv", ".flv", ".ts")
+OPERATIONS = ("thumbnails", "dedupe", "grab")
+MANIFEST_NAME = "manifest.json"
+
+
+def find_videos(paths, extensions=VIDEO_EXTENSIONS, exclude=None):
+    """
+    Expands files, directories (searched recursively) and glob patterns into a sorted list
+    of video files. Files given directly are kept whatever their extension. Matches inside
+    the `exclude` directory are skipped, e.g. the outputs of an earlier batch.
+    """
+    excluded = os.path.join(os.path.realpath(exclude), "") if exclude else None
+    videos = set()
+    for path in paths:
+        if os.path.isfile(path):
+            videos.add(os.path.abspath(path))
+            continue
+        if os.path.isdir(path):
+            matches = glob.glob(os.path.join(glob.escape(path), "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(path, recursive=True)
+        for match in matches:
+            if excluded and os.path.realpath(match).startswith(excluded):
+                continue
+            if os.path.isfile(match) and match.lower().endswith(extensions):
+                videos.add(os.path.abspath(match))
+    return sorted(videos)
+
+
+def output_name(video_path):
+    # Videos with the same name in different directories get their own outputs
+    digest = hashlib.sha1(os.path.abspath(video_path).encode()).hexdigest()[:8]
+    return f"{os.path.splitext(os.path.basename(video_path))[0]}-{digest}"
+
+
+def process_video(operation, video_path, output_directory, options):
+    """
+    Runs one batch operation on one video. Called in the worker processes, so everything
+    heavy is imported here once per worker.
+
+    Returns:
+        list: The paths of the files written.
+    """
+    name = output_name(video_path)
+    if operation == "thumbnails":
+        from .ffmpeg_cmd import grab_thumbnails
+        directory = os.path.join(output_directory, name)
+        os.makedirs(directory, exist_ok=True)
+        return grab_thumbnails(video_path, directory, options["count"])
+    if operation == "grab":
+        from .ffmpeg_cmd import grab_frames
+        directory = os.path.join(output_directory, name)
+        os.makedirs(directory, exist_ok=True)
+        return grab_frames(video_path, options["timestamps"], directory)
+    if operation == "dedupe":
+        from .deduper import dedupe_video
+        output_file = os.path.join(output_directory, f"{name}.mkv")
+        if dedupe_video(video_path, output_file, min_length=options["min_length"], threshold=options["threshold"],
+                        method=options["method"]) is None:
+            raise IOError(f"Could not open video file: {video_path}")
+        return [output_file]
+    raise ValueError(f"Unknown batch operation: {operation}")
+
+
+def _timed_process_video(operation, video_path, output_directory, options):
+    start = time.perf_counter()
+    outputs = process_video(operation, video_path, output_directory, options)
+    # Grabs past the end of a video are reported but never written
+    written = [path for path in outputs if os.path.exists(path)]
+    if not written:
+        raise IOError(f"No output written for {video_path}")
+    # Relative to the output directory, so the manifest still matches when run from elsewhere
+    return [os.path.relpath(path, output_directory) for path in written], time.perf_counter() - start
+
+
+def load_manifest(output_directory):
+    try:
+        with open(os.path.join(output_directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"videos": {}}
+
+
+def save_manifest(output_directory, manifest):
+    with atomic_write(os.path.join(output_directory, MANIFEST_NAME)) as f:
+        json.dump(manifest, f, indent=2)
+
+
+def is_up_to_date(entry, fingerprint, operation, options, output_directory):
+    return (
+        entry is not None
+        and entry.get("status") == "ok"
+        and entry.get("fingerprint") == fingerprint
+        and entry.get("operation") == operation
+        and entry.get("options") == options
+        and bool(entry.get("outputs"))
+        and all(os.path.exists(os.path.join(output_directory, path)) for path in entry["outputs"])
+    )
+
+
+def run_batch(operation, paths, output_directory, workers=4, options=None, force=False):
+    """
+    Runs `operation` ('thumbnails', 'dedupe' or 'grab') over every video found in `paths`
+    on a pool of `workers` processes.
+
+    Results are recorded in manifest.json in `output_directory`: per video its fingerprint,
+    the operation and options, the files written (relative to `output_directory`), the time
+    taken and whether it failed. A video that writes no output at all counts as failed.
+    Videos whose manifest entry matches the current file and options, and whose outputs
+    still exist, are skipped unless `force` is set. The manifest is rewritten after every
+    video, so an interrupted batch picks up where it stopped.
+
+    Returns:
+        dict: The manifest.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown batch operation: {operation}")
+    options = options or {}
+    os.makedirs(output_directory, exist_ok=True)
+    manifest = load_manifest(output_directory)
+    entries = manifest["videos"]
+
+    # The output directory can be inside a scanned directory, don't process earlier outputs
+    videos = find_videos(paths, exclude=output_directory)
+    todo = []
+    skipped = 0
+    for video_path in videos:
+        fingerprint = file_fingerprint(video_path)
+        if not force and is_up_to_date(entries.get(video_path), fingerprint, operation, options, output_directory):
+            skipped += 1
+            continue
+        todo.append((video_path, fingerprint))
+    print(f"{len(videos)} videos, {skipped} up to date, {len(todo)} to process")
+
+    # Imported here, the CLI imports this module for OPERATIONS on every command
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_timed_process_video, operation, video_path, output_directory, options): (video_path, fingerprint)
+            for video_path, fingerprint in todo
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            video_path, fingerprint = futures[future]
+            entry = {"fingerprint": fingerprint, "operation": operation, "options": options}
+            try:
+                outputs, seconds = future.result()
+                entry.update({"status": "ok", "outputs": outputs, "seconds": round(seconds, 3)})
+                print(f"[{done}/{len(todo)}] {video_path} ({seconds:.1f}s)")
+            except Exception as e:
+                failed += 1
+                entry.update({"status": "failed", "error": f"{type(e).__name__}: {e}", "outputs": []})
+                print(f"[{done}/{len(todo)}] Failed {video_path}: {e}")
+            entries[video_path] = entry
+            save_manifest(output_directory, manifest)
+
+    manifest["summary"] = {
+        "operation": operation,
+        "videos": len(videos),
+        "processed": len(todo) - failed,
+        "skipped": skipped,
+        "failed": failed,
+    }
+    save_manifest(output_directory, manifest)
+    print(f"{len(todo) - failed} processed, {skipped} skipped, {failed} failed. Manifest: {os.path.join(output_directory, MANIFEST_NAME)}")
+    return manifest
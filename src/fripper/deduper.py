@@ -1,7 +1,81 @@
 import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
 import cv2
 import numpy as np
 from skimage.metrics import structural_similarity as ssim
+from . import trace
+from .ffmpeg_cmd import atomic_write, file_fingerprint
+from .ffmpeg_cmd.probe import CACHE_DIR
+from .frame_store import FrameStore
+
+CHECKPOINT_DIR = os.path.join(CACHE_DIR, "dedupe")
+# Score at which frames count as duplicates for each comparison method
+DEFAULT_THRESHOLDS = {
+    "histogram": 0.99999,
+    "ssim": 0.99,
+}
+# In ssim mode pairs whose histogram correlation (first channel, as in the histogram method)
+# is below this are called different without computing SSIM. Much looser than the histogram
+# threshold so it only skips obvious changes, but a pair can pass SSIM and still fail it, e.g.
+# when only the blue channel changes. Pass ssim_gate=None (--no-ssim-gate) for pure SSIM.
+SSIM_HISTOGRAM_GATE = 0.99
+
+class FrameStoreCapture:
+    """
+    Reads a FrameStore through the subset of the cv2.VideoCapture interface used here, so
+    every dedupe path can run on a store as well as on a video file.
+    """
+
+    def __init__(self, path):
+        self.store = FrameStore(path)
+        self.position = 0
+
+    def isOpened(self):
+        return self.store.frames is not None
+
+    def read(self):
+        if self.position >= len(self.store):
+            return False, None
+        frame = self.store[self.position]
+        self.position += 1
+        return True, frame
+
+    def grab(self):
+        return self.read()[0]
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.store.shape[1]
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.store.shape[0]
+        if prop == cv2.CAP_PROP_FPS:
+            return self.store.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return len(self.store)
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return self.position
+        if prop == cv2.CAP_PROP_POS_MSEC:
+            # Timestamp of the last frame read, like OpenCV
+            return max(self.position - 1, 0) * 1000 / self.store.fps
+        return 0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = min(max(int(value), 0), len(self.store))
+            return True
+        return False
+
+    def release(self):
+        self.store.close()
+
+def open_capture(input_file):
+    # Frame stores are read directly, anything else is decoded by OpenCV
+    if input_file.endswith(".frames"):
+        return FrameStoreCapture(input_file)
+    return cv2.VideoCapture(input_file)
 
 def are_frames_duplicate_histogram(frame1, frame2, threshold=0.99999):
     hist1 = cv2.calcHist([frame1], [0], None, [256], [0, 256])
@@ -17,9 +91,202 @@ def are_frames_duplicate(frame1, frame2, threshold=0.99):
     gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
     gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
     
-    similarity, _ = ssim(gray1, gray2, full=True)
+    similarity = ssim(gray1, gray2)
     return similarity >= threshold
 
+class FastSSIM:
+    """
+    Computes only the mean SSIM of two uint8 grayscale images, without the full SSIM map.
+
+    Matches the defaults of skimage.metrics.structural_similarity: a 7x7 uniform window
+    with sample covariance, data range 255 and the window radius cropped from the borders
+    before averaging. The local means are OpenCV box filters over float32 buffers that are
+    allocated once per image size and reused for every pair. With `gaussian` an 11x11
+    Gaussian window with sigma 1.5 and population covariance is used instead, which matches
+    skimage only with both `gaussian_weights=True` and `use_sample_covariance=False`.
+
+    Args:
+        downscale (int, optional): Shrink both images by this factor before comparing.
+                        Defaults to 1.
+        gaussian (bool, optional): Use a Gaussian instead of a uniform window. Defaults to False.
+    """
+
+    C1 = (0.01 * 255) ** 2
+    C2 = (0.03 * 255) ** 2
+
+    def __init__(self, downscale=1, gaussian=False):
+        self.downscale = downscale
+        self.gaussian = gaussian
+        if gaussian:
+            self.window = 11
+            self.covariance_norm = 1.0
+        else:
+            self.window = 7
+            self.covariance_norm = self.window ** 2 / (self.window ** 2 - 1)
+        self.pad = (self.window - 1) // 2
+        self.shape = None
+
+    def _allocate(self, shape):
+        self.shape = shape
+        self.x, self.y, self.xx, self.yy, self.xy, self.ux, self.uy, self.uxx, self.uyy, self.uxy = (
+            np.empty(shape, dtype=np.float32) for _ in range(10)
+        )
+
+    def _filter(self, src, dst):
+        if self.gaussian:
+            cv2.GaussianBlur(src, (self.window, self.window), 1.5, dst=dst, borderType=cv2.BORDER_REFLECT)
+        else:
+            cv2.boxFilter(src, cv2.CV_32F, (self.window, self.window), dst=dst, borderType=cv2.BORDER_REFLECT)
+
+    def _prepare(self, gray):
+        if self.downscale > 1:
+            height, width = gray.shape
+            gray = cv2.resize(gray, (width // self.downscale, height // self.downscale), interpolation=cv2.INTER_AREA)
+        return gray
+
+    def __call__(self, gray1, gray2):
+        gray1 = self._prepare(gray1)
+        gray2 = self._prepare(gray2)
+        if gray1.shape != self.shape:
+            self._allocate(gray1.shape)
+
+        x, y, xx, yy, xy = self.x, self.y, self.xx, self.yy, self.xy
+        ux, uy, uxx, uyy, uxy = self.ux, self.uy, self.uxx, self.uyy, self.uxy
+        np.copyto(x, gray1)
+        np.copyto(y, gray2)
+        np.multiply(x, x, out=xx)
+        np.multiply(y, y, out=yy)
+        np.multiply(x, y, out=xy)
+        for src, dst in ((x, ux), (y, uy), (xx, uxx), (yy, uyy), (xy, uxy)):
+            self._filter(src, dst)
+
+        # Reuse the input buffers for the terms of the SSIM formula
+        a1, a2, b1, b2 = x, y, xx, yy
+        norm = self.covariance_norm
+        np.multiply(ux, uy, out=a1)                  # ux * uy
+        np.subtract(uxy, a1, out=a2)                 # cov(x, y) / norm
+        np.multiply(a2, 2 * norm, out=a2)
+        a2 += self.C2
+        np.multiply(a1, 2, out=a1)
+        a1 += self.C1
+        np.multiply(ux, ux, out=b1)
+        np.multiply(uy, uy, out=xy)
+        b1 += xy                                      # ux ** 2 + uy ** 2
+        np.add(uxx, uyy, out=b2)
+        b2 -= b1
+        np.multiply(b2, norm, out=b2)                 # var(x) + var(y)
+        b2 += self.C2
+        b1 += self.C1
+
+        np.multiply(a1, a2, out=a1)
+        np.multiply(b1, b2, out=b1)
+        np.divide(a1, b1, out=a1)
+        p = self.pad
+        return float(a1[p:-p, p:-p].mean(dtype=np.float64))
+
+def are_frames_duplicate_fast(frame1, frame2, threshold=0.99, downscale=1, comparator=None):
+    """
+    Same check as are_frames_duplicate using FastSSIM. Pass a `comparator` to reuse its
+    buffers across calls.
+    """
+    comparator = comparator or FastSSIM(downscale)
+    gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+    return comparator(gray1, gray2) >= threshold
+
+def frame_histogram(frame):
+    hist = cv2.calcHist([frame], [0], None, [256], [0, 256])
+    return cv2.normalize(hist, hist).ravel()
+
+def histogram_correlation(hists1, hists2):
+    """
+    Row-wise equivalent of cv2.compareHist(hist1, hist2, cv2.HISTCMP_CORREL) over two
+    stacks of histograms with shape (n, bins). Uses the same float64 sums as OpenCV so the
+    scores match the per-pair version.
+    """
+    a = np.asarray(hists1, dtype=np.float64)
+    b = np.asarray(hists2, dtype=np.float64)
+    bins = a.shape[1]
+
+    s1 = a.sum(axis=1)
+    s2 = b.sum(axis=1)
+    num = (a * b).sum(axis=1) - s1 * s2 / bins
+    denom2 = ((a * a).sum(axis=1) - s1 * s1 / bins) * ((b * b).sum(axis=1) - s2 * s2 / bins)
+
+    valid = np.abs(denom2) > np.finfo(np.float64).eps
+    return np.where(valid, num / np.sqrt(np.where(valid, denom2, 1.0)), 1.0)
+
+def frame_signature(frame, size=32):
+    # Nearest neighbour only touches size * size pixels of the full frame
+    small = cv2.resize(frame, (size, size), interpolation=cv2.INTER_NEAREST)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return gray.astype(np.int16).ravel()
+
+def batch_duplicate_flags(frames, threshold=None, prefilter=False, signature_tolerance=2.0, method="histogram", comparator=None,
+                          ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Compares each frame in `frames` with the one after it. Returns a boolean array where
+    flags[i] is True when frames[i] and frames[i + 1] are duplicates according to
+    `are_frames_duplicate_histogram`, or with `method` 'ssim' according to
+    `are_frames_duplicate_fast` using `comparator`.
+
+    Every histogram is computed once and the comparisons run as one vectorized correlation.
+    With `prefilter` a downscaled grayscale signature is compared first, and histograms are
+    only computed for pairs whose mean absolute signature difference is within
+    `signature_tolerance` gray levels. This skips most of the work on changing footage, but
+    pairs with equal histograms and different content are no longer reported.
+
+    With `method` 'ssim' pairs whose histogram correlation is below `ssim_gate` are
+    reported as different without computing SSIM (see SSIM_HISTOGRAM_GATE). With
+    `ssim_gate` None every pair is decided by SSIM alone.
+
+    `threshold` defaults to DEFAULT_THRESHOLDS[method], as do the thresholds of the
+    functions below that take a `method`.
+    """
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+    flags = np.zeros(max(len(frames) - 1, 0), dtype=bool)
+    if len(frames) < 2:
+        return flags
+
+    if prefilter:
+        signatures = np.stack([frame_signature(frame) for frame in frames])
+        differences = np.abs(signatures[1:] - signatures[:-1]).mean(axis=1)
+        pairs = np.flatnonzero(differences <= signature_tolerance)
+    else:
+        pairs = np.arange(len(frames) - 1)
+
+    if len(pairs) == 0:
+        return flags
+
+    if method == "histogram" or ssim_gate is not None:
+        hists = np.zeros((len(frames), 256), dtype=np.float32)
+        for i in np.union1d(pairs, pairs + 1):
+            hists[i] = frame_histogram(frames[i])
+        correlations = histogram_correlation(hists[pairs], hists[pairs + 1])
+
+    if method == "histogram":
+        flags[pairs] = correlations >= threshold
+        return flags
+
+    comparator = comparator or FastSSIM()
+    if ssim_gate is not None:
+        # SSIM only for the pairs the histogram check can't already rule out
+        pairs = pairs[correlations >= ssim_gate]
+    grays = {i: cv2.cvtColor(frames[i], cv2.COLOR_BGR2GRAY) for i in np.union1d(pairs, pairs + 1)}
+    for i in pairs:
+        flags[i] = comparator(grays[i], grays[i + 1]) >= threshold
+    return flags
+
+def read_frames(cap, count):
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    return frames
+
 def filter_consecutive(lst, min_length=10):
     if not lst:
         return []
@@ -42,7 +309,7 @@ def filter_consecutive(lst, min_length=10):
     return filtered
 
 def get_duplicate_frames(input_file):
-    cap = cv2.VideoCapture(input_file)
+    cap = open_capture(input_file)
     if not cap.isOpened():
         print("Error: Could not open video file.")
         return
@@ -71,8 +338,313 @@ def get_duplicate_frames(input_file):
     # print(f"Duplicate frames: {duplicates}")
     return duplicates
 
-def remove_duplicate_frames(input_file, duplicate_frames):
-    cap = cv2.VideoCapture(input_file)
+def iter_duplicate_flags(cap, threshold=None, batch_size=256, prefilter=False, signature_tolerance=2.0, max_frames=None,
+                         method="histogram", downscale=1, ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Reads every frame from an opened cv2.VideoCapture and yields (frame, is_duplicate), where
+    is_duplicate means the frame matches the one after it (the same index that
+    get_duplicate_frames reports). Frames are compared `batch_size` at a time with
+    `batch_duplicate_flags`, so at most one batch is held in memory.
+
+    Stops after `max_frames` frames if given, in which case the last frame is reported as
+    not duplicate since the frame after it is never read. With `method` 'ssim' frames are
+    compared with FastSSIM, shrunk by `downscale`, behind the `ssim_gate` histogram check.
+    """
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+    comparator = FastSSIM(downscale) if method == "ssim" else None
+    carry = None  # Last frame of the previous batch, its flag depends on the next batch
+    remaining = max_frames
+
+    while remaining is None or remaining > 0:
+        with trace.span("decode", count=batch_size) as args:
+            frames = read_frames(cap, batch_size if remaining is None else min(batch_size, remaining))
+            args["count"] = len(frames)
+        if not frames:
+            break
+        if remaining is not None:
+            remaining -= len(frames)
+        if carry is not None:
+            frames.insert(0, carry)
+
+        with trace.span("compare", method=method, count=len(frames)):
+            flags = batch_duplicate_flags(frames, threshold, prefilter, signature_tolerance, method, comparator, ssim_gate)
+        for frame, flag in zip(frames[:-1], flags):
+            yield frame, bool(flag)
+
+        carry = frames[-1]
+
+    if carry is not None:
+        yield carry, False
+
+def get_duplicate_frames_batched(input_file, threshold=None, batch_size=256, prefilter=False, signature_tolerance=2.0,
+                                 method="histogram", downscale=1, ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Batched version of get_duplicate_frames. Returns the same indices as the frame by frame
+    loop for the same threshold (unless `prefilter` is used).
+    """
+    cap = open_capture(input_file)
+    if not cap.isOpened():
+        print("Error: Could not open video file.")
+        return
+
+    duplicates = []
+    frame_count = 0
+    for frame_count, (_, duplicate) in enumerate(iter_duplicate_flags(cap, threshold, batch_size, prefilter, signature_tolerance,
+                                                                                     method=method, downscale=downscale,
+                                                                                     ssim_gate=ssim_gate), 1):
+        if duplicate:
+            duplicates.append(frame_count - 1)
+
+    cap.release()
+
+    if frame_count == 0:
+        print("Error: Could not read the first frame.")
+        return
+
+    return duplicates
+
+def seek_capture(cap, input_file, start):
+    """
+    Moves `cap` to frame `start`. Returns the capture to read from, which is a new one if
+    seeking was not frame accurate for this file and it had to step there from the beginning.
+
+    OpenCV reports whatever position was asked for after a seek, so the seek is checked by
+    reading the frame before `start` and comparing its timestamp with (start - 1) / fps.
+    """
+    if start > 0:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start - 1)
+        accurate = fps > 0 and cap.grab() and abs(cap.get(cv2.CAP_PROP_POS_MSEC) - (start - 1) * 1000 / fps) < 500 / fps
+        if not accurate:
+            cap.release()
+            cap = open_capture(input_file)
+            for _ in range(start):
+                if not cap.grab():
+                    break
+    return cap
+
+def segment_duplicate_frames(input_file, start, end=None, threshold=None, batch_size=256, prefilter=False, signature_tolerance=2.0,
+                             method="histogram", downscale=1, ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Returns the duplicate indices in [start, end) by seeking to frame `start` and reading up
+    to and including frame `end`, which is shared with the next segment so the comparison
+    across the boundary is not lost. Reads to the end of the video if `end` is None.
+    """
+    cap = open_capture(input_file)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video file: {input_file}")
+    cap = seek_capture(cap, input_file, start)
+
+    max_frames = None if end is None else end - start + 1
+    duplicates = []
+    for offset, (_, duplicate) in enumerate(iter_duplicate_flags(cap, threshold, batch_size, prefilter, signature_tolerance,
+                                                                             max_frames, method, downscale, ssim_gate)):
+        if duplicate:
+            duplicates.append(start + offset)
+
+    cap.release()
+    return duplicates
+
+def get_duplicate_frames_parallel(input_file, workers=4, threshold=None, batch_size=256, prefilter=False, signature_tolerance=2.0,
+                                  method="histogram", downscale=1, ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Splits the video into `workers` segments by frame index and runs
+    segment_duplicate_frames for each one in its own process. Returns the merged, sorted
+    duplicate indices, the same as get_duplicate_frames_batched.
+    """
+    cap = open_capture(input_file)
+    if not cap.isOpened():
+        print("Error: Could not open video file.")
+        return
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    segment_length = max(total_frames // workers, 1)
+    starts = list(range(0, max(total_frames - 1, 1), segment_length))[:workers]
+    # The frame count from the container can be off, so the last segment reads to the end
+    ends = starts[1:] + [None]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(segment_duplicate_frames, input_file, start, end, threshold, batch_size, prefilter,
+                            signature_tolerance, method, downscale, ssim_gate)
+            for start, end in zip(starts, ends)
+        ]
+        duplicates = []
+        for future in futures:
+            duplicates.extend(future.result())
+
+    return duplicates
+
+def checkpoint_path_for(input_file, settings):
+    # One checkpoint per version of the input file and detection settings
+    key = hashlib.sha1(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"{file_fingerprint(input_file)}_{key}.json")
+
+def load_checkpoint(checkpoint_path, fingerprint, settings):
+    """
+    Reads a dedupe checkpoint. Returns the state to start from, which is a fresh one if the
+    checkpoint is missing, unreadable or was written for another file or other settings.
+    """
+    state = {
+        "fingerprint": fingerprint,
+        "settings": settings,
+        "next_frame": 0,
+        "run_start": 0,
+        "run_length": 0,
+        "runs": [],
+        "complete": False,
+    }
+    try:
+        with open(checkpoint_path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return state
+    if saved.get("fingerprint") != fingerprint or saved.get("settings") != settings:
+        print(f"Ignoring checkpoint {checkpoint_path} for a different file or settings")
+        return state
+    state.update(saved)
+    return state
+
+def save_checkpoint(checkpoint_path, state):
+    # An interrupt never leaves half a checkpoint
+    with atomic_write(checkpoint_path) as f:
+        json.dump(state, f)
+
+def get_duplicate_frames_resumable(input_file, checkpoint_path=None, min_length=10, threshold=None, batch_size=256,
+                                   prefilter=False, signature_tolerance=2.0, checkpoint_every=1000, method="histogram", downscale=1,
+                                   ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Finds the duplicate frames to remove, like get_duplicate_frames followed by
+    filter_consecutive, saving its progress to a checkpoint every `checkpoint_every` frames.
+
+    The checkpoint holds the next frame to compare, the run of duplicates still in progress
+    and the runs of at least `min_length` duplicates found so far. An interrupted call
+    continues from the last checkpoint instead of frame 0, and once detection has finished
+    the checkpoint keeps the complete result, so calling this again on the unchanged file
+    with the same settings returns it without decoding anything.
+
+    Args:
+        checkpoint_path (str, optional): Where to keep the checkpoint. Defaults to a file in
+                        the fripper cache directory named after the input's fingerprint and
+                        the detection settings.
+
+    Returns:
+        list: The indices of the frames to remove.
+    """
+    if threshold is None:
+        threshold = DEFAULT_THRESHOLDS[method]
+    settings = {
+        "min_length": min_length,
+        "threshold": threshold,
+        "prefilter": prefilter,
+        "signature_tolerance": signature_tolerance,
+        "method": method,
+        "downscale": downscale,
+        "ssim_gate": ssim_gate,
+    }
+    if checkpoint_path is None:
+        checkpoint_path = checkpoint_path_for(input_file, settings)
+    state = load_checkpoint(checkpoint_path, file_fingerprint(input_file), settings)
+
+    if state["complete"]:
+        print(f"Using duplicate frames from {checkpoint_path}")
+    else:
+        cap = open_capture(input_file)
+        if not cap.isOpened():
+            raise IOError(f"Could not open video file: {input_file}")
+        if state["next_frame"]:
+            print(f"Resuming from frame {state['next_frame']}")
+        cap = seek_capture(cap, input_file, state["next_frame"])
+
+        try:
+            for _, duplicate in iter_duplicate_flags(cap, threshold, batch_size, prefilter, signature_tolerance,
+                                                     method=method, downscale=downscale, ssim_gate=ssim_gate):
+                if duplicate:
+                    if state["run_length"] == 0:
+                        state["run_start"] = state["next_frame"]
+                    state["run_length"] += 1
+                else:
+                    if state["run_length"] >= min_length:
+                        state["runs"].append([state["run_start"], state["run_length"]])
+                    state["run_length"] = 0
+                state["next_frame"] += 1
+                if state["next_frame"] % checkpoint_every == 0:
+                    save_checkpoint(checkpoint_path, state)
+        except KeyboardInterrupt:
+            save_checkpoint(checkpoint_path, state)
+            print(f"Interrupted at frame {state['next_frame']}, progress saved to {checkpoint_path}")
+            raise
+        finally:
+            cap.release()
+
+        # The last frame is never a duplicate, so no run is left open here
+        state["complete"] = True
+        save_checkpoint(checkpoint_path, state)
+
+    return [index for start, length in state["runs"] for index in range(start, start + length)]
+
+def dedupe_video(input_file, output_file="output.mkv", min_length=10, threshold=None, batch_size=256, prefilter=False, signature_tolerance=2.0,
+                 method="histogram", downscale=1, ssim_gate=SSIM_HISTOGRAM_GATE):
+    """
+    Detects and removes duplicate frames in a single decode of the input video.
+
+    Produces the same output as get_duplicate_frames, filter_consecutive and
+    remove_duplicate_frames run one after another. Frames that start a run of duplicates
+    are held back until the run either reaches `min_length` (and is dropped) or ends early
+    (and is written), so memory stays bounded by `batch_size + min_length` frames no matter
+    how long the video is.
+
+    Returns:
+        tuple: (frames written, frames removed), or None if the video could not be opened.
+    """
+    cap = open_capture(input_file)
+    if not cap.isOpened():
+        print("Error: Could not open video file.")
+        return
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+
+    fourcc = cv2.VideoWriter_fourcc(*'FFV1')
+    out = cv2.VideoWriter(output_file, fourcc, fps, (frame_width, frame_height))
+
+    write_timer = trace.Timer("write")
+    pending = []  # Current run of duplicates while it is still shorter than min_length
+    run_length = 0
+    written = 0
+    removed = 0
+
+    for frame, duplicate in iter_duplicate_flags(cap, threshold, batch_size, prefilter, signature_tolerance,
+                                                 method=method, downscale=downscale, ssim_gate=ssim_gate):
+        if duplicate:
+            run_length += 1
+            if run_length < min_length:
+                pending.append(frame)
+            else:
+                removed += len(pending) + 1
+                pending.clear()
+            continue
+
+        with write_timer:
+            for pending_frame in pending:
+                out.write(pending_frame)
+            out.write(frame)
+        written += len(pending) + 1
+        pending.clear()
+        run_length = 0
+
+    with write_timer:
+        out.release()
+    cap.release()
+    write_timer.emit(frames=written)
+
+    return written, removed
+
+def remove_duplicate_frames(input_file, duplicate_frames, output_file="output.mkv"):
+    cap = open_capture(input_file)
     if not cap.isOpened():
         print("Error: Could not open video file.")
         return
@@ -83,15 +655,20 @@ def remove_duplicate_frames(input_file, duplicate_frames):
     
     # fourcc = cv2.VideoWriter_fourcc(*'XVID')
     fourcc = cv2.VideoWriter_fourcc(*'FFV1')
-    out = cv2.VideoWriter('output.mkv', fourcc, fps, (frame_width, frame_height))
+    out = cv2.VideoWriter(output_file, fourcc, fps, (frame_width, frame_height))
 
+    duplicate_frames = set(duplicate_frames)
+    decode_timer = trace.Timer("decode")
+    write_timer = trace.Timer("write")
     frame_count = 0
     while True:
-        ret, frame = cap.read()
+        with decode_timer:
+            ret, frame = cap.read()
         if not ret:
             break
         if frame_count not in duplicate_frames:
-            out.write(frame)
+            with write_timer:
+                out.write(frame)
         frame_count += 1
 
         # if frame_count in duplicates:
@@ -100,23 +677,61 @@ def remove_duplicate_frames(input_file, duplicate_frames):
         #     cap.set(cv2.CAP_PROP_POS_AVI_RATIO, 0)
         #     cap.set(cv2.CAP_PROP_POS_MSEC, 0
     cap.release()
-    out.release()
+    with write_timer:
+        out.release()
+    decode_timer.emit(frames=frame_count)
+    write_timer.emit(frames=frame_count - len(duplicate_frames))
 
 def main():
     parser = argparse.ArgumentParser(description="Detect duplicate frames in a video.")
-    parser.add_argument("input_file", type=str, help="Path to the video file")
+    parser.add_argument("input_file", type=str, help="Path to the video file or a .frames frame store")
+    parser.add_argument("--method", choices=sorted(DEFAULT_THRESHOLDS), default="histogram", help="How consecutive frames are compared")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Histogram correlation or SSIM at which frames count as duplicates. Defaults to 0.99999 for histogram and 0.99 for ssim")
+    parser.add_argument("--downscale", type=int, default=1, help="Shrink frames by this factor before computing SSIM")
+    parser.add_argument("--no-ssim-gate", action="store_true",
+                        help="Compute SSIM for every pair instead of only for pairs whose histograms are already close")
+    parser.add_argument("--batch-size", type=int, default=256, help="Number of frames compared per batch")
+    parser.add_argument("--prefilter", action="store_true", help="Skip histograms for frames whose downscaled signatures clearly differ")
+    parser.add_argument("--min-length", type=int, default=10, help="Minimum run of consecutive duplicates to remove")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes to detect duplicates with")
+    parser.add_argument("--output", type=str, default="output.mkv", help="Path to write the deduplicated video to")
+    parser.add_argument("--resumable", action="store_true",
+                        help="Checkpoint detection so an interrupted run resumes. Costs a second decode to write the output")
+    parser.add_argument("--checkpoint", type=str, default=None, help="Path of the checkpoint file, implies --resumable. Defaults to one in the fripper cache directory")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="Number of frames between checkpoints")
+    parser.add_argument("--trace", type=str, default=None, help="Record stage and subprocess timings to this file (.json for Chrome's trace viewer, JSON lines otherwise)")
     args = parser.parse_args()
+    if args.trace:
+        trace.enable_tracing(args.trace)
+    if args.threshold is None:
+        args.threshold = DEFAULT_THRESHOLDS[args.method]
+    compare = {"method": args.method, "downscale": args.downscale, "ssim_gate": None if args.no_ssim_gate else SSIM_HISTOGRAM_GATE}
 
-    duplicate_frames = get_duplicate_frames(args.input_file)
-    # print(duplicate_frames)
-    filtered_duplicate_frames = filter_consecutive(duplicate_frames)
-    # print(filtered_duplicate_frames)
-
-    remove_duplicate_frames(args.input_file, filtered_duplicate_frames)
-
+    if args.workers > 1:
+        # Detection is sharded across processes, writing still needs one sequential pass
+        duplicate_frames = get_duplicate_frames_parallel(args.input_file, workers=args.workers, threshold=args.threshold,
+                                                         batch_size=args.batch_size, prefilter=args.prefilter, **compare)
+        filtered_duplicate_frames = filter_consecutive(duplicate_frames, min_length=args.min_length)
+        remove_duplicate_frames(args.input_file, filtered_duplicate_frames, args.output)
+        print(f"Removed {len(filtered_duplicate_frames)} duplicates")
+        return
 
+    if not (args.resumable or args.checkpoint):
+        # One decode: duplicates are detected and the output written in the same pass
+        result = dedupe_video(args.input_file, args.output, min_length=args.min_length, threshold=args.threshold,
+                              batch_size=args.batch_size, prefilter=args.prefilter, **compare)
+        if result:
+            written, removed = result
+            print(f"Wrote {written} frames, removed {removed} duplicates")
+        return
 
-    
+    # The output can't be appended to, so only detection resumes and the write is one pass at the end
+    filtered_duplicate_frames = get_duplicate_frames_resumable(args.input_file, args.checkpoint, min_length=args.min_length,
+                                                               threshold=args.threshold, batch_size=args.batch_size,
+                                                               prefilter=args.prefilter, checkpoint_every=args.checkpoint_every, **compare)
+    remove_duplicate_frames(args.input_file, filtered_duplicate_frames, args.output)
+    print(f"Removed {len(filtered_duplicate_frames)} duplicates")
 
 if __name__ == "__main__":
     main()
@@ -1,2 +1,6 @@
-from .__main__ import rip_frames, grab_frame, grab_thumbnails, get_clip, get_frame_count
-from .utils import seconds_to_hms, subtract_seconds, add_seconds, add_timestamps, calculate_inner_thumbnail_positions
+from .__main__ import rip_frames, stream_frames, get_video_dimensions, get_length_of_video, grab_frame, grab_frame_regions, grab_frames, grab_thumbnails, get_clip, get_clip_regions, get_frame_count, snap_to_keyframes, START_DURATION
+from .decoder import DecoderOptions, HWACCELS
+from .export import crop_view, write_image
+from .grabber import FrameGrabber, open_grabber, get_grabber, close_grabber
+from .probe import probe_video, get_keyframes, file_fingerprint
+from .utils import atomic_write, seconds_to_hms, hms_to_seconds, subtract_seconds, add_seconds, add_timestamps, calculate_inner_thumbnail_positions
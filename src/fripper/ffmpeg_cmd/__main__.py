@@ -1,7 +1,31 @@
 import os
+import shutil
+from bisect import bisect_left, bisect_right
 import subprocess
-
-from .utils import calculate_inner_thumbnail_positions, seconds_to_hms
+import tempfile
+import threading
+from collections import deque
+
+from .. import trace
+from .decoder import DecoderOptions, run_with_fallback
+from .export import write_image
+from .grabber import get_grabber
+from .probe import probe_video, get_keyframes
+from .utils import calculate_inner_thumbnail_positions, seconds_to_hms, hms_to_seconds
+
+# Timestamps closer together than this on average are grabbed by decoding straight through
+# with a select filter, further apart each one gets its own fast input seek.
+SELECT_MAX_AVERAGE_GAP = 5.0
+# Every -ss input opens its own demuxer and decoder, so very long lists are split up
+MAX_SEEK_INPUTS = 32
+# Keeps the select expression well under the per-argument length limit
+MAX_SELECT_TIMESTAMPS = 500
+# Last lines of FFmpeg's stderr kept while streaming frames, shown if it fails
+STDERR_TAIL_LINES = 200
+# Seconds decoded after the fast input seek before the accurate output seek takes over
+SEEK_MARGIN = 2.0
+# Seconds rip_frames extracts after `start` when no duration is given
+START_DURATION = 2
 
 
 def is_path_valid(video_path):
@@ -22,7 +46,7 @@ def is_path_valid(video_path):
         raise FileNotFoundError(f"Error: The file '{video_path}' does not exist")
 
 
-def rip_frames(video_path, output_directory, output_pattern, fps=4, start=None, nvidia=False):
+def rip_frames(video_path, output_directory, output_pattern, fps=4, start=None, nvidia=False, decoder=None, duration=None):
     """
     Extracts frames from a video file using FFmpeg and saves them to the specified
     output directory a specified frame rate.
@@ -38,6 +62,10 @@ def rip_frames(video_path, output_directory, output_pattern, fps=4, start=None,
                              Defaults to 4.
         nvidia (bool, optional): Whether to use NVIDIA CUDA hardware acceleration for
                             processing. Defaults to False.
+        decoder (DecoderOptions, optional): Hardware decoding, threads, keyframe-only
+                            decoding and output height. Overrides `nvidia` when given.
+        duration (float, optional): Seconds to extract. Defaults to START_DURATION after
+                            `start` when it is given, otherwise to the rest of the video.
 
     Returns:
         None
@@ -57,37 +85,18 @@ def rip_frames(video_path, output_directory, output_pattern, fps=4, start=None,
 
     is_path_valid(video_path)
     output_pattern = os.path.join(output_directory, output_pattern)
+    decoder = decoder or DecoderOptions.from_nvidia(nvidia)
+    if start and duration is None:
+        duration = START_DURATION
 
-    if nvidia:
-        command = [
-            "ffmpeg",
-            "-hwaccel",
-            "cuda",
-            "-i",
-            video_path,  # Input video
-            "-vf",
-            f"fps={fps}",  # Extract 4 frames per second
-            output_pattern,  # Output frames to temporary directory
-        ]
-    else:
-        command = [
-            "ffmpeg",
-            "-i",
-            video_path,  # Input video
-            "-vf",
-            f"fps={fps}",  # Extract 4 frames per second
-            output_pattern,  # Output frames to temporary directory
-        ]
-
-    # TODO: Hack - This hardcodes a 2 second duration when start is specified. This needs to be specified via a parameter for more flexibility.
-    if start:
-        command = command[:1] + ["-ss", start, "-t", "2"] + command[1:]
-
-    print(command)
+    def make_command(decoder):
+        command = _rip_frames_command(video_path, output_pattern, fps, start, decoder, duration)
+        print(command)
+        return command
 
     try:
         # Run the FFmpeg command to extract frames
-        subprocess.run(command, check=True)
+        run_with_fallback(make_command, decoder, outputs=[output_directory])
         print(f"Frames extracted to: {output_directory}")
 
     except subprocess.CalledProcessError as e:
@@ -95,7 +104,160 @@ def rip_frames(video_path, output_directory, output_pattern, fps=4, start=None,
         raise subprocess.CalledProcessError
 
 
-def grab_frame(video_path, timestamp, output_directory=None, crop=None):
+def _rip_frames_command(video_path, output_pattern, fps, start, decoder, duration=None):
+    command = [
+        "ffmpeg",
+        *decoder.input_args(),
+        "-i",
+        video_path,  # Input video
+        "-vf",
+        ",".join(decoder.filters([f"fps={fps}"])),  # Extract `fps` frames per second
+        output_pattern,  # Output frames to temporary directory
+    ]
+
+    if duration:
+        command = command[:1] + ["-t", str(duration)] + command[1:]
+    if start:
+        command = command[:1] + ["-ss", start] + command[1:]
+    return command
+
+
+def stream_frames(video_path, fps=4, start=None, duration=None, size=None, pix_fmt="bgr24", nvidia=False, decoder=None):
+    """
+    Decodes frames from a video file with FFmpeg and yields them as NumPy arrays without
+    writing anything to disk.
+
+    FFmpeg writes raw frames (`-f rawvideo`) to a pipe which are read into a single reusable
+    buffer. Each yielded array is a zero-copy view of that buffer, so it is only valid until
+    the next frame is requested. Call `.copy()` on frames that need to be kept around.
+
+    Args:
+        video_path (str): The path to the input video file to extract frames from.
+        fps (int, optional): The frame rate (frames per second) at which to extract frames.
+                             Defaults to 4. None keeps every frame of the video.
+        start (str, optional): Timestamp to start decoding from (format: HH:MM:SS.mmm).
+        duration (float, optional): Number of seconds to decode. Decodes until the end of the
+                            video if not provided.
+        size (tuple, optional): (width, height) to scale the frames to. Defaults to the size
+                            of the video, or the decoder's output height.
+        pix_fmt (str, optional): Raw pixel format of the frames, either 'bgr24' (OpenCV
+                            order) or 'rgb24'. Defaults to 'bgr24'.
+        nvidia (bool, optional): Whether to use NVIDIA CUDA hardware acceleration for
+                            processing. Defaults to False.
+        decoder (DecoderOptions, optional): Hardware decoding, threads, keyframe-only
+                            decoding and output height. Overrides `nvidia` when given. A
+                            failing hardware decode is retried in software if it fails
+                            before the first frame.
+
+    Yields:
+        numpy.ndarray: A (height, width, 3) uint8 view of the current frame.
+
+    Raises:
+        FileNotFoundError: If the input video file does not exist (checked via `is_path_valid`).
+        ValueError: If `pix_fmt` is not a supported 3 channel format.
+        subprocess.CalledProcessError: If FFmpeg exits with an error.
+    """
+    is_path_valid(video_path)
+    if pix_fmt not in ("bgr24", "rgb24"):
+        raise ValueError(f"Unsupported pixel format: {pix_fmt}")
+    decoder = decoder or DecoderOptions.from_nvidia(nvidia)
+
+    # The pipe has no header, so the frame size has to be known up front
+    scale = bool(size or decoder.height)
+    if not size:
+        size = decoder.scaled_size(*get_video_dimensions(video_path))
+
+    frames = _stream_frames(video_path, fps, start, duration, size, scale, pix_fmt, decoder)
+    if not decoder.hardware:
+        yield from frames
+        return
+
+    streamed = False
+    try:
+        for frame in frames:
+            streamed = True
+            yield frame
+    except subprocess.CalledProcessError:
+        if streamed:
+            raise
+        print(f"{decoder.hwaccel} decoding failed, falling back to software decoding")
+        yield from _stream_frames(video_path, fps, start, duration, size, scale, pix_fmt, decoder.software())
+
+
+def _stream_frames(video_path, fps, start, duration, size, scale, pix_fmt, decoder):
+    # Imported here so commands that only shell out to ffmpeg don't pay for numpy
+    import numpy as np
+
+    width, height = size
+    filters = [f"fps={fps}"] if fps else []
+    if scale:
+        # Explicit size instead of the decoder's scale filter, the pipe needs exactly this size
+        filters.append(f"scale={width}:{height}")
+
+    command = ["ffmpeg", "-hide_banner", "-loglevel", "error", *decoder.input_args()]
+    if start:
+        command += ["-ss", start]
+    if duration:
+        command += ["-t", str(duration)]
+    command += [
+        "-i",
+        video_path,  # Input video
+        *(["-vf", ",".join(filters)] if filters else []),
+        # Without an fps filter keep exactly the decoded frames, no duplicates or drops
+        *([] if fps else ["-fps_mode", "passthrough"]),
+        "-f",
+        "rawvideo",  # Raw frames, no container
+        "-pix_fmt",
+        pix_fmt,
+        "pipe:1",  # Output frames to stdout
+    ]
+
+    print(command)
+
+    frame_size = width * height * 3
+    buffer = bytearray(frame_size)
+    view = memoryview(buffer)
+    frame = np.frombuffer(buffer, dtype=np.uint8).reshape((height, width, 3))
+
+    # The span covers the whole stream, including the time the consumer spends per frame
+    with trace.span("ffmpeg", "subprocess", command=" ".join(command)) as args:
+        children_start = trace.children_cpu()
+        frames = 0
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        # Read stderr alongside stdout, a full stderr pipe would block FFmpeg and with it the frame reads
+        stderr_lines = deque(maxlen=STDERR_TAIL_LINES)
+        stderr_reader = threading.Thread(target=stderr_lines.extend, args=(process.stderr,), daemon=True)
+        stderr_reader.start()
+        try:
+            while True:
+                bytes_read = 0
+                while bytes_read < frame_size:
+                    chunk = process.stdout.readinto(view[bytes_read:])
+                    if not chunk:
+                        break
+                    bytes_read += chunk
+                if bytes_read < frame_size:
+                    break
+                frames += 1
+                yield frame
+        except BaseException:
+            # Consumer stopped early (or was interrupted), no need to decode the rest
+            process.kill()
+            raise
+        finally:
+            process.stdout.close()
+            process.wait()
+            stderr_reader.join()
+            process.stderr.close()
+            stderr = b"".join(stderr_lines)
+            args.update({"returncode": process.returncode, "bytes_written": frames * frame_size,
+                         "frames": frames, "child_cpu_s": trace.children_cpu() - children_start})
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+
+def grab_frame(video_path, timestamp, output_directory=None, crop=None, decoder=None, frame=None):
     """
     Extracts a single frame from a video at a specified timestamp and saves it as a JPEG image.
 
@@ -105,6 +267,14 @@ def grab_frame(video_path, timestamp, output_directory=None, crop=None):
                          'HH:MM:SS.MS'.
         output_directory (str, optional): The directory to save the extracted frame image. If
                         not provided, the image is saved in the current working directory.
+        decoder (DecoderOptions, optional): Hardware decoding, threads and output height.
+                        The crop is applied before scaling, in source coordinates.
+        frame (numpy.ndarray, optional): The frame at `timestamp`, already decoded at the
+                        source resolution (e.g. the one on screen in the splitter). It is
+                        cropped as a view and encoded straight to disk, nothing is decoded.
+
+    Without `frame`, if a FrameGrabber is open for the video (see `open_grabber`) the frame
+    is read from it, and only otherwise FFmpeg decodes it.
 
     Raises:
         subprocess.CalledProcessError: If an error occurs during the frame extraction process
@@ -114,25 +284,54 @@ def grab_frame(video_path, timestamp, output_directory=None, crop=None):
         video_filename (str): The path the frame was saved to.
     """
     # TODO: Validate timestamp
+    output_image_path = _output_path(video_path, timestamp, output_directory, ".jpg")
+
+    decoder = decoder or DecoderOptions()
+    if frame is not None and write_image(frame, output_image_path, crop, decoder.height):
+        print(f"Frame saved to {output_image_path}")
+        return output_image_path
+
+    grabber = get_grabber(video_path)
+    if grabber and grabber.save(hms_to_seconds(timestamp), output_image_path, crop, decoder.height):
+        print(f"Frame grabbed and saved to {output_image_path}")
+        return output_image_path
+
+    if crop:
+        print(f"Cropping to {crop_filter(crop)}")
+
+    def make_command(decoder):
+        command = _grab_frame_command(video_path, timestamp, output_image_path, crop, decoder)
+        print(f"{command=}")
+        return command
+
+    try:
+        run_with_fallback(make_command, decoder, outputs=[output_image_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        print(f"Frame extracted and saved to {output_image_path}")
+    except subprocess.CalledProcessError as e:
+        print(f"Error occurred: {e.stderr.decode()}")
+
+    return output_image_path
+
+def _output_path(video_path, timestamp, output_directory, suffix):
+    # <video name>_<timestamp><suffix> in the output directory, or the current directory
     video_filename = os.path.splitext(os.path.basename(video_path))[0]
     timestamp_str = timestamp.replace(":", "-").replace(".", "-")
-
     if output_directory:
         is_path_valid(output_directory)
-        output_image_path = os.path.join(
-            output_directory, f"{video_filename}_{timestamp_str}.jpg"
-        )
     else:
-        output_image_path = os.path.join(
-            os.getcwd(), f"{video_filename}_{timestamp_str}.jpg"
-        )
+        output_directory = os.getcwd()
+    return os.path.join(output_directory, f"{video_filename}_{timestamp_str}{suffix}")
 
-    command = [
+def _grab_frame_command(video_path, timestamp, output_image_path, crop, decoder):
+    filters = decoder.filters([crop_filter(crop)] if crop else [])
+    return [
         "ffmpeg",
+        *decoder.input_args(),
         "-ss",
         timestamp,  # Seek to the specific timestamp
         "-i",
         video_path,  # Input video
+        *(["-vf", ",".join(filters)] if filters else []),
         "-frames:v",
         "1",  # Extract only one frame
         "-q:v",
@@ -140,85 +339,292 @@ def grab_frame(video_path, timestamp, output_directory=None, crop=None):
         output_image_path,  # Output image path
         "-y",  # Overwrite output file if it exists
     ]
-    if crop:
-        width = crop[1][0] - crop[0][0]
-        height = crop[1][1] - crop[0][1]
-        x = crop[0][0]
-        y = crop[0][1]
-        print(f"{width=} : {height=} : {x=} : {y=}")
-        command.insert(len(command) - 2, "-vf")
-        command.insert(len(command) - 2, f"crop={width}:{height}:{x}:{y}")
-        print(f"{command=}")
-    else:
+
+def crop_filter(crop):
+    width = crop[1][0] - crop[0][0]
+    height = crop[1][1] - crop[0][1]
+    x = crop[0][0]
+    y = crop[0][1]
+    return f"crop={width}:{height}:{x}:{y}"
+
+def _regions_filter(regions, decoder):
+    # One decoded stream split into a crop (then the decoder's scale) per region, [r0], [r1], ...
+    names = list(regions)
+    chains = [f"[0:v]split={len(names)}" + "".join(f"[s{i}]" for i in range(len(names)))]
+    for i, name in enumerate(names):
+        chains.append(f"[s{i}]{','.join(decoder.filters([crop_filter(regions[name])]))}[r{i}]")
+    return ";".join(chains)
+
+def _grab_regions_command(video_path, timestamp, output_paths, regions, decoder):
+    command = [
+        "ffmpeg",
+        *decoder.input_args(),
+        "-ss",
+        timestamp,
+        "-i",
+        video_path,
+        "-filter_complex",
+        _regions_filter(regions, decoder),
+    ]
+    for i, output_path in enumerate(output_paths):
+        command += ["-map", f"[r{i}]", "-frames:v", "1", "-q:v", "2", output_path]
+    return command + ["-y"]
+
+def grab_frame_regions(video_path, timestamp, regions, output_directory=None, decoder=None, frame=None):
+    """
+    Saves several named crops of the frame at `timestamp` while decoding it only once, named
+    like `grab_frame` with the region name appended.
+
+    A resident `frame` (see `grab_frame`) or a frame read from an open FrameGrabber is
+    cropped into views and each region written with `write_image`. Otherwise one FFmpeg
+    process decodes the frame, splits it and writes one cropped output per region.
+
+    Args:
+        video_path (str): The path to the video.
+        timestamp (str): The timestamp of the frame (format: HH:MM:SS.mmm).
+        regions (dict): Region name -> [(x1, y1), (x2, y2)] in source coordinates.
+        output_directory (str, optional): Where to save the images. Defaults to the current
+                        working directory.
+        decoder (DecoderOptions, optional): Hardware decoding, threads and output height.
+        frame (numpy.ndarray, optional): The frame at `timestamp`, already decoded at the
+                        source resolution.
+
+    Returns:
+        dict: Region name -> path of its image, for the regions that were written.
+    """
+    if not regions:
+        return {}
+    output_paths = {name: _output_path(video_path, timestamp, output_directory, f"_{name}.jpg") for name in regions}
+    decoder = decoder or DecoderOptions()
+
+    if frame is None:
+        grabber = get_grabber(video_path)
+        frame = grabber.read(hms_to_seconds(timestamp)) if grabber else None
+    if frame is not None:
+        written = {name: path for name, path in output_paths.items() if write_image(frame, path, regions[name], decoder.height)}
+        print(f"{len(written)} regions saved from the frame at {timestamp}")
+        return written
+
+    def make_command(decoder):
+        command = _grab_regions_command(video_path, timestamp, list(output_paths.values()), regions, decoder)
         print(f"{command=}")
+        return command
 
     try:
-        subprocess.run(
-            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
-        print(f"Frame extracted and saved to {output_image_path}")
+        run_with_fallback(make_command, decoder, outputs=list(output_paths.values()), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        print(f"{len(output_paths)} regions extracted from the frame at {timestamp}")
     except subprocess.CalledProcessError as e:
         print(f"Error occurred: {e.stderr.decode()}")
+        return {}
+    return output_paths
+
+def _grab_frames_seek_command(video_path, seconds, output_paths, crop, decoder):
+    command = ["ffmpeg", "-y"]
+    for position in seconds:
+        command += [*decoder.input_args(), "-ss", f"{position:.3f}", "-i", video_path]
+    filters = decoder.filters([crop_filter(crop)] if crop else [])
+    for i, output_path in enumerate(output_paths):
+        command += ["-map", f"{i}:v:0", "-frames:v", "1", "-q:v", "2"]
+        if filters:
+            command += ["-vf", ",".join(filters)]
+        command.append(output_path)
+    return command
+
+def _select_offsets(seconds):
+    # Milliseconds after the first timestamp, used both in the filter and to match the images
+    first = min(seconds)
+    return [round((position - first) * 1000) for position in seconds]
+
+def _grab_frames_select_command(video_path, seconds, output_pattern, crop, decoder):
+    terms = [
+        # First frame at or after each timestamp, unless an earlier frame already covered it
+        f"gte(t,{offset / 1000:.3f})*(isnan(prev_selected_t)+lt(prev_selected_t,{offset / 1000:.3f}))"
+        for offset in sorted(set(_select_offsets(seconds)))
+    ]
+    filters = decoder.filters([f"select='{'+'.join(terms)}'", "settb=1/1000", *([crop_filter(crop)] if crop else [])])
 
-    return output_image_path
-
-def get_length_of_video(video_path):
-    command = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-select_streams",
-        "v:0",
-        "-show_entries",
-        "format=duration",
-        "-of",
-        "csv=p=0",
-        video_path
+    return [
+        "ffmpeg",
+        "-y",
+        *decoder.input_args(),
+        "-ss",
+        f"{min(seconds):.3f}",  # Seek once, which makes the filter timestamps start at 0
+        "-i",
+        video_path,
+        "-vf",
+        ",".join(filters),
+        "-fps_mode",
+        "passthrough",  # One image per selected frame
+        "-enc_time_base",
+        "1/1000",  # The settb above, named values like 'filter' need a newer FFmpeg
+        "-frame_pts",
+        "1",  # Name each image after its timestamp in milliseconds
+        "-q:v",
+        "2",
+        output_pattern,
     ]
 
+def _collect_selected_frames(temp_dir, seconds, output_paths):
+    # Each timestamp gets the first image named at or after its offset
+    selected = sorted(int(os.path.splitext(name)[0]) for name in os.listdir(temp_dir))
+    offsets = _select_offsets(seconds)
+    position = 0
+    for i in sorted(range(len(seconds)), key=lambda i: offsets[i]):
+        while position < len(selected) and selected[position] < offsets[i]:
+            position += 1
+        if position == len(selected):
+            print(f"No frame found at {seconds_to_hms(seconds[i])}")
+            continue
+        shutil.copyfile(os.path.join(temp_dir, f"{selected[position]}.jpg"), output_paths[i])
+
+def _run_grab_command(make_command, decoder, outputs=()):
+    def make_printed_command(decoder):
+        command = make_command(decoder)
+        print(f"{command=}")
+        return command
+
     try:
-        result = subprocess.run(
-        command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-    )
+        run_with_fallback(make_printed_command, decoder, outputs, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return True
     except subprocess.CalledProcessError as e:
         print(f"Error occurred: {e.stderr.decode()}")
+        return False
 
-    # print(result.stdout.decode())
-    return float(result.stdout.decode())
+def grab_frames(video_path, timestamps, output_directory=None, crop=None, method=None, decoder=None):
+    """
+    Extracts frames at many timestamps of a video with a single FFmpeg process and saves them
+    as JPEG images, named the same way as `grab_frame`.
 
-def grab_thumbnails(video_path, output_directory=None):
-    video_length = get_length_of_video(video_path)
-    positions = calculate_inner_thumbnail_positions(video_length, 4)
-    image_paths = []
-    for position in positions:
-        image_paths.append(grab_frame(video_path, seconds_to_hms(position), output_directory))
-    return image_paths
+    Timestamps that are close together are grabbed by decoding once through the range and
+    picking the first frame at or after each timestamp with a `select` filter. Timestamps
+    that are far apart use one fast `-ss` input seek each. Very long lists are split over
+    several processes (MAX_SELECT_TIMESTAMPS or MAX_SEEK_INPUTS per process). If a
+    FrameGrabber is open for the video every frame is read from it instead.
 
-def get_clip(video_path, start_timestamp, end_timestamp, output_directory=None, crop=None):
-    # TODO: Validate timestamp
-    video_filename = os.path.splitext(os.path.basename(video_path))[0]
-    video_extension = os.path.splitext(os.path.basename(video_path))[1]
-    timestamp_str = start_timestamp.replace(":", "-").replace(".", "-")
+    Args:
+        video_path (str): The path to the video file from which to extract the frames.
+        timestamps (list): Timestamps to grab, as 'HH:MM:SS.mmm' strings or seconds.
+        output_directory (str, optional): The directory to save the extracted frame images. If
+                        not provided, the images are saved in the current working directory.
+        crop (list, optional): [(x1, y1), (x2, y2)] region to crop every frame to.
+        method (str, optional): Force 'select' or 'seek' instead of choosing by the spacing
+                        of the timestamps.
+        decoder (DecoderOptions, optional): Hardware decoding, threads and output height.
+                        The crop is applied before scaling, in source coordinates.
+
+    Returns:
+        list: The paths the frames were saved to, in the same order as `timestamps`.
+    """
+    is_path_valid(video_path)
+    if not timestamps:
+        return []
 
     if output_directory:
         is_path_valid(output_directory)
-        output_video_path = os.path.join(
-            output_directory, f"{video_filename}_{timestamp_str}{video_extension}"
-        )
     else:
-        output_video_path = os.path.join(
-            os.getcwd(), f"{video_filename}_{timestamp_str}{video_extension}"
-        )
-    print(output_directory)
-    print(output_video_path)
-    command = [
+        output_directory = os.getcwd()
+
+    seconds = [hms_to_seconds(timestamp) for timestamp in timestamps]
+    output_paths = [
+        _output_path(video_path, timestamp if isinstance(timestamp, str) else seconds_to_hms(timestamp), output_directory, ".jpg")
+        for timestamp in timestamps
+    ]
+
+    decoder = decoder or DecoderOptions()
+    grabber = get_grabber(video_path)
+    if grabber:
+        # In time order so the grabber mostly reads forward instead of seeking
+        for i in sorted(range(len(seconds)), key=lambda i: seconds[i]):
+            if not grabber.save(seconds[i], output_paths[i], crop, decoder.height):
+                print(f"No frame found at {seconds_to_hms(seconds[i])}")
+        print(f"{len(output_paths)} frames extracted to {output_directory}")
+        return output_paths
+
+    if method is None:
+        average_gap = (max(seconds) - min(seconds)) / len(seconds)
+        method = "select" if average_gap <= SELECT_MAX_AVERAGE_GAP else "seek"
+
+    if method == "select":
+        # Chunk in time order so every process decodes one contiguous range
+        order = sorted(range(len(seconds)), key=lambda i: seconds[i])
+        for i in range(0, len(order), MAX_SELECT_TIMESTAMPS):
+            chunk = order[i:i + MAX_SELECT_TIMESTAMPS]
+            chunk_seconds = [seconds[j] for j in chunk]
+            with tempfile.TemporaryDirectory() as temp_dir:
+                output_pattern = os.path.join(temp_dir, "%d.jpg")
+                make_command = lambda decoder: _grab_frames_select_command(video_path, chunk_seconds, output_pattern, crop, decoder)
+                if _run_grab_command(make_command, decoder, [temp_dir]):
+                    _collect_selected_frames(temp_dir, chunk_seconds, [output_paths[j] for j in chunk])
+    elif method == "seek":
+        for i in range(0, len(seconds), MAX_SEEK_INPUTS):
+            chunk_seconds = seconds[i:i + MAX_SEEK_INPUTS]
+            chunk_paths = output_paths[i:i + MAX_SEEK_INPUTS]
+            make_command = lambda decoder: _grab_frames_seek_command(video_path, chunk_seconds, chunk_paths, crop, decoder)
+            _run_grab_command(make_command, decoder, chunk_paths)
+    else:
+        raise ValueError(f"Unknown grab method: {method}")
+
+    print(f"{len(output_paths)} frames extracted to {output_directory}")
+    return output_paths
+
+def get_video_dimensions(video_path):
+    info = probe_video(video_path)
+    return info["width"], info["height"]
+
+def get_length_of_video(video_path):
+    return probe_video(video_path)["duration"]
+
+def grab_thumbnails(video_path, output_directory=None, num_thumbnails=4, decoder=None):
+    video_length = get_length_of_video(video_path)
+    positions = calculate_inner_thumbnail_positions(video_length, num_thumbnails)
+    return grab_frames(video_path, [seconds_to_hms(position) for position in positions], output_directory, decoder=decoder)
+
+def seek_arguments(video_path, start_seconds):
+    """
+    Input arguments that seek to `start_seconds` without decoding the whole file before it.
+
+    The input `-ss` jumps close to the target using the container index (no decoding), and
+    the output `-ss` then decodes only the last SEEK_MARGIN seconds to land on the exact
+    frame. Durations after these arguments must be given with `-t`, not `-to`.
+    """
+    input_seek = max(start_seconds - SEEK_MARGIN, 0)
+    return ["-ss", f"{input_seek:.3f}", "-i", video_path, "-ss", f"{start_seconds - input_seek:.3f}"]
+
+def snap_to_keyframes(keyframes, start_seconds, end_seconds):
+    # Widen the range to the keyframe at or before the start and at or after the end
+    if not keyframes:
+        return start_seconds, end_seconds
+    index = bisect_right(keyframes, start_seconds) - 1
+    snapped_start = keyframes[max(index, 0)]
+    index = bisect_left(keyframes, end_seconds)
+    snapped_end = keyframes[index] if index < len(keyframes) else end_seconds
+    return snapped_start, snapped_end
+
+def _clip_command(video_path, start_seconds, end_seconds, output_video_path, crop, copy, decoder):
+    if copy:
+        return [
+            "ffmpeg",
+            "-ss",
+            f"{start_seconds + 0.001:.3f}",  # Just past the keyframe so rounding can't seek to the one before
+            "-i",
+            video_path,
+            "-t",
+            f"{end_seconds - start_seconds:.3f}",
+            "-c",
+            "copy",
+            "-avoid_negative_ts",
+            "make_zero",
+            output_video_path,
+            "-y",
+        ]
+    filters = decoder.filters([crop_filter(crop)] if crop else [])
+    return [
         "ffmpeg",
-        "-i",
-        video_path,
-        "-ss",
-        start_timestamp,
-        "-to",
-        end_timestamp,
+        *decoder.input_args(),
+        *seek_arguments(video_path, start_seconds),
+        "-t",
+        f"{end_seconds - start_seconds:.3f}",
+        *(["-vf", ",".join(filters)] if filters else []),
         "-c:v",
         "libx264",
         "-c:a",
@@ -229,56 +635,110 @@ def get_clip(video_path, start_timestamp, end_timestamp, output_directory=None,
         "-y",
     ]
 
-    if crop:
-        width = crop[1][0] - crop[0][0]
-        height = crop[1][1] - crop[0][1]
-        x = crop[0][0]
-        y = crop[0][1]
-        print(f"{width=} : {height=} : {x=} : {y=}")
-        command.insert(len(command) - 2, "-vf")
-        command.insert(len(command) - 2, f"crop={width}:{height}:{x}:{y}")
-        print(f"{command=}")
-    else:
+def _clip_regions_command(video_path, start_seconds, end_seconds, output_paths, regions, decoder):
+    # The fast input seek and -i once, the accurate output seek per output
+    seek = seek_arguments(video_path, start_seconds)
+    command = ["ffmpeg", *decoder.input_args(), *seek[:4], "-filter_complex", _regions_filter(regions, decoder)]
+    for i, output_path in enumerate(output_paths):
+        # Output options only apply to the next output, so every output gets the accurate seek and duration
+        command += [*seek[4:], "-t", f"{end_seconds - start_seconds:.3f}", "-map", f"[r{i}]", "-map", "0:a?",
+                    "-c:v", "libx264", "-c:a", "aac", "-strict", "experimental", output_path]
+    return command + ["-y"]
+
+def get_clip_regions(video_path, start_timestamp, end_timestamp, regions, output_directory=None, decoder=None):
+    """
+    Extracts one clip per named crop region of the same time range with a single FFmpeg
+    process. The range is decoded once and split into a crop per region, each encoded to its
+    own output, so N regions cost one decode instead of N. Clips are named like `get_clip`
+    with the region name appended.
+
+    Args:
+        regions (dict): Region name -> [(x1, y1), (x2, y2)] in source coordinates.
+
+    Returns:
+        bool: True if FFmpeg succeeded.
+    """
+    if not regions:
+        return True
+    extension = os.path.splitext(video_path)[1]
+    output_paths = [_output_path(video_path, start_timestamp, output_directory, f"_{name}{extension}") for name in regions]
+    start_seconds = hms_to_seconds(start_timestamp)
+    end_seconds = hms_to_seconds(end_timestamp)
+    decoder = decoder or DecoderOptions()
+
+    def make_command(decoder):
+        command = _clip_regions_command(video_path, start_seconds, end_seconds, output_paths, regions, decoder)
         print(f"{command=}")
+        return command
 
     try:
-        result = subprocess.run(
-            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
+        run_with_fallback(make_command, decoder, outputs=output_paths, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
         print(f"Error occurred: {e.stderr.decode()}")
-
+        return False
     return True
 
+def get_clip(video_path, start_timestamp, end_timestamp, output_directory=None, crop=None, copy=False, decoder=None):
+    """
+    Extracts the part of a video between two timestamps.
 
-def get_frame_count(video_path, start_timestamp, num_frames, fps=16, output_directory=None, crop=None):
-    # TODO: Validate timestamp
-    video_filename = os.path.splitext(os.path.basename(video_path))[0]
-    video_extension = os.path.splitext(os.path.basename(video_path))[1]
-    timestamp_str = start_timestamp.replace(":", "-").replace(".", "-")
+    By default the clip is re-encoded with libx264 and starts on the exact frame, using a
+    fast input seek followed by an accurate output seek. With `copy` the range is widened to
+    the surrounding keyframes (from the cached keyframe index) and the streams are copied
+    without re-encoding, which is much faster but not frame exact. Cropping always needs a
+    re-encode, so `copy` is ignored when `crop` is given.
 
-    clip_duration = 1 / fps * num_frames
-    print(f"Clip duration: {clip_duration} ----- 1 / {fps} * {num_frames}")
+    A re-encode decodes with `decoder` (hardware decoding, threads, output height), a
+    stream copy never decodes and ignores it.
 
-    if output_directory:
-        is_path_valid(output_directory)
-        output_video_path = os.path.join(
-            output_directory, f"{video_filename}_{timestamp_str}{video_extension}"
-        )
-    else:
-        output_video_path = os.path.join(
-            os.getcwd(), f"{video_filename}_{timestamp_str}{video_extension}"
-        )
+    Returns:
+        bool: True if FFmpeg succeeded.
+    """
+    # TODO: Validate timestamp
+    output_video_path = _output_path(video_path, start_timestamp, output_directory, os.path.splitext(video_path)[1])
     print(output_directory)
     print(output_video_path)
-    command = [
+
+    start_seconds = hms_to_seconds(start_timestamp)
+    end_seconds = hms_to_seconds(end_timestamp)
+
+    if copy and crop:
+        print("Cropping needs a re-encode, ignoring copy")
+        copy = False
+
+    if copy:
+        start_seconds, end_seconds = snap_to_keyframes(get_keyframes(video_path), start_seconds, end_seconds)
+        print(f"Snapped to keyframes: {seconds_to_hms(start_seconds)} - {seconds_to_hms(end_seconds)}")
+
+    decoder = decoder or DecoderOptions()
+    if crop:
+        print(f"Cropping to {crop_filter(crop)}")
+
+    def make_command(decoder):
+        command = _clip_command(video_path, start_seconds, end_seconds, output_video_path, crop, copy, decoder)
+        print(f"{command=}")
+        return command
+
+    try:
+        # A stream copy has nothing to fall back from
+        run_with_fallback(make_command, DecoderOptions() if copy else decoder, outputs=[output_video_path],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except subprocess.CalledProcessError as e:
+        print(f"Error occurred: {e.stderr.decode()}")
+        return False
+
+    return True
+
+
+def _frame_count_command(video_path, start_timestamp, clip_duration, output_video_path, crop, decoder):
+    filters = decoder.filters([crop_filter(crop)] if crop else [])
+    return [
         "ffmpeg",
-        "-i",
-        video_path,
-        "-ss",
-        start_timestamp,
+        *decoder.input_args(),
+        *seek_arguments(video_path, hms_to_seconds(start_timestamp)),
         "-t",
         str(clip_duration),
+        *(["-vf", ",".join(filters)] if filters else []),
         "-c:v",
         "libx264",
         "-c:a",
@@ -289,27 +749,28 @@ def get_frame_count(video_path, start_timestamp, num_frames, fps=16, output_dire
         "-y",
     ]
 
+
+def get_frame_count(video_path, start_timestamp, num_frames, fps=16, output_directory=None, crop=None, decoder=None):
+    # TODO: Validate timestamp
+    clip_duration = 1 / fps * num_frames
+    print(f"Clip duration: {clip_duration} ----- 1 / {fps} * {num_frames}")
+
+    output_video_path = _output_path(video_path, start_timestamp, output_directory, os.path.splitext(video_path)[1])
+    print(output_directory)
+    print(output_video_path)
     if crop:
-        width = crop[1][0] - crop[0][0]
-        height = crop[1][1] - crop[0][1]
-        x = crop[0][0]
-        y = crop[0][1]
-        print(f"{width=} : {height=} : {x=} : {y=}")
-        command.insert(len(command) - 2, "-vf")
-        command.insert(len(command) - 2, f"crop={width}:{height}:{x}:{y}")
-        print(f"{command=}")
-    else:
+        print(f"Cropping to {crop_filter(crop)}")
+
+    def make_command(decoder):
+        command = _frame_count_command(video_path, start_timestamp, clip_duration, output_video_path, crop, decoder)
         print(f"{command=}")
+        return command
 
     try:
-        result = subprocess.run(
-            command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        )
+        run_with_fallback(make_command, decoder or DecoderOptions(), outputs=[output_video_path],
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except subprocess.CalledProcessError as e:
         print(f"Error occurred: {e.stderr.decode()}")
+        return False
 
     return True
-
-
-
-
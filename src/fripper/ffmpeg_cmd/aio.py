@@ -0,0 +1,210 @@
+import asyncio
+import os
+import subprocess
+
+from .. import trace
+from .__main__ import _clip_command, _frame_count_command, _grab_frame_command, _output_path, _rip_frames_command, is_path_valid, snap_to_keyframes, START_DURATION
+from .decoder import DecoderOptions
+from .probe import _ffprobe_command, _keyframe_probe_command, _load_cached, _parse_ffprobe, _parse_keyframes, _store_cached, file_fingerprint
+from .utils import hms_to_seconds, seconds_to_hms
+
+DEFAULT_CONCURRENCY = os.cpu_count() or 4
+
+
+class AsyncFFmpeg:
+    """
+    Runs FFmpeg and ffprobe from an asyncio event loop with `asyncio.create_subprocess_exec`,
+    so many grabs, clips and probes can run at once without a thread per job. The commands
+    are built by the same functions as the blocking API in `fripper.ffmpeg_cmd`.
+
+    At most `concurrency` processes run at the same time, the rest wait their turn. A
+    process that runs longer than its timeout is killed and raises subprocess.TimeoutExpired.
+    Cancelling the task that awaits a call kills its process as well. Waiting for a free slot
+    doesn't count towards the timeout.
+
+    Registered FrameGrabbers are not used here, reading them would block the event loop.
+
+    Args:
+        concurrency (int, optional): Most processes running at once. Defaults to the
+                        number of CPUs.
+        timeout (float, optional): Default seconds a single process may run. Defaults to
+                        no limit. Every method also takes its own `timeout`.
+
+    Example:
+        >>> ffmpeg = AsyncFFmpeg(concurrency=16, timeout=30)
+        >>> paths = await asyncio.gather(*(ffmpeg.grab_frame(path, "00:00:05.000", "thumbs") for path in videos))
+    """
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, timeout=None):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.timeout = timeout
+
+    async def run(self, command, outputs=(), timeout=None):
+        """
+        Runs a command once a slot is free and waits for it, the async `trace.run`.
+
+        Returns:
+            subprocess.CompletedProcess: With the captured stdout and stderr as bytes.
+
+        Raises:
+            subprocess.CalledProcessError: If the command exits with an error.
+            subprocess.TimeoutExpired: If it runs longer than the timeout, after killing it.
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        async with self.semaphore:
+            with trace.span(os.path.basename(command[0]), "subprocess", command=" ".join(map(str, command))) as args:
+                children_start = trace.children_cpu()
+                process = await asyncio.create_subprocess_exec(*command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                stdout = b""
+                try:
+                    stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+                except asyncio.TimeoutError:
+                    await _kill(process)
+                    raise subprocess.TimeoutExpired(command, timeout)
+                except BaseException:
+                    # Cancelled, don't leave FFmpeg running for a result nobody waits for
+                    await _kill(process)
+                    raise
+                finally:
+                    args["returncode"] = process.returncode
+                    args["child_cpu_s"] = trace.children_cpu() - children_start
+                    if trace.tracing_enabled():
+                        args["bytes_written"] = len(stdout) + sum(trace._size(path) for path in outputs)
+
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command, stdout, stderr)
+        return subprocess.CompletedProcess(command, process.returncode, stdout, stderr)
+
+    async def run_with_fallback(self, make_command, decoder, outputs=(), timeout=None):
+        """The async `run_with_fallback`, retries a failed hardware decode in software."""
+        try:
+            return await self.run(make_command(decoder), outputs, timeout)
+        except subprocess.CalledProcessError:
+            if not decoder.hardware:
+                raise
+            print(f"{decoder.hwaccel} decoding failed, falling back to software decoding")
+            return await self.run(make_command(decoder.software()), outputs, timeout)
+
+    async def probe_video(self, video_path, keyframes=False, cache=True, timeout=None):
+        """`probe_video`, sharing its on-disk cache with the blocking API."""
+        if not os.path.exists(video_path):
+            raise FileNotFoundError(f"Error: The file '{video_path}' does not exist")
+
+        fingerprint = file_fingerprint(video_path)
+        info = _load_cached(fingerprint) if cache else None
+        updated = False
+
+        if info is None:
+            result = await self.run(_ffprobe_command(video_path), timeout=timeout)
+            info = _parse_ffprobe(result.stdout)
+            updated = True
+        if keyframes and "keyframes" not in info:
+            result = await self.run(_keyframe_probe_command(video_path), timeout=timeout)
+            info = dict(info, keyframes=_parse_keyframes(result.stdout))
+            updated = True
+
+        if cache and updated:
+            _store_cached(fingerprint, info)
+        return info
+
+    async def get_keyframes(self, video_path, timeout=None):
+        return (await self.probe_video(video_path, keyframes=True, timeout=timeout))["keyframes"]
+
+    async def get_video_dimensions(self, video_path, timeout=None):
+        info = await self.probe_video(video_path, timeout=timeout)
+        return info["width"], info["height"]
+
+    async def get_length_of_video(self, video_path, timeout=None):
+        return (await self.probe_video(video_path, timeout=timeout))["duration"]
+
+    async def rip_frames(self, video_path, output_directory, output_pattern, fps=4, start=None, decoder=None, duration=None, timeout=None):
+        """
+        `rip_frames`: extracts frames at `fps` into `output_directory`.
+
+        Raises:
+            subprocess.CalledProcessError: If FFmpeg fails.
+        """
+        is_path_valid(video_path)
+        output_pattern = os.path.join(output_directory, output_pattern)
+        if start and duration is None:
+            duration = START_DURATION
+        await self.run_with_fallback(
+            lambda decoder: _rip_frames_command(video_path, output_pattern, fps, start, decoder, duration),
+            decoder or DecoderOptions(), outputs=[output_directory], timeout=timeout,
+        )
+        print(f"Frames extracted to: {output_directory}")
+
+    async def grab_frame(self, video_path, timestamp, output_directory=None, crop=None, decoder=None, timeout=None):
+        """
+        `grab_frame`: saves the frame at `timestamp` as a JPEG.
+
+        Returns:
+            str: The path the frame was saved to.
+        """
+        output_image_path = _output_path(video_path, timestamp, output_directory, ".jpg")
+        try:
+            await self.run_with_fallback(
+                lambda decoder: _grab_frame_command(video_path, timestamp, output_image_path, crop, decoder),
+                decoder or DecoderOptions(), outputs=[output_image_path], timeout=timeout,
+            )
+            print(f"Frame extracted and saved to {output_image_path}")
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred: {e.stderr.decode()}")
+        return output_image_path
+
+    async def get_clip(self, video_path, start_timestamp, end_timestamp, output_directory=None, crop=None, copy=False, decoder=None, timeout=None):
+        """
+        `get_clip`: extracts the part of a video between two timestamps.
+
+        Returns:
+            bool: True if FFmpeg succeeded.
+        """
+        output_video_path = _output_path(video_path, start_timestamp, output_directory, os.path.splitext(video_path)[1])
+        start_seconds = hms_to_seconds(start_timestamp)
+        end_seconds = hms_to_seconds(end_timestamp)
+
+        if copy and crop:
+            print("Cropping needs a re-encode, ignoring copy")
+            copy = False
+        if copy:
+            keyframes = await self.get_keyframes(video_path, timeout=timeout)
+            start_seconds, end_seconds = snap_to_keyframes(keyframes, start_seconds, end_seconds)
+            print(f"Snapped to keyframes: {seconds_to_hms(start_seconds)} - {seconds_to_hms(end_seconds)}")
+
+        try:
+            # A stream copy has nothing to fall back from
+            await self.run_with_fallback(
+                lambda decoder: _clip_command(video_path, start_seconds, end_seconds, output_video_path, crop, copy, decoder),
+                DecoderOptions() if copy else decoder or DecoderOptions(), outputs=[output_video_path], timeout=timeout,
+            )
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred: {e.stderr.decode()}")
+            return False
+        return True
+
+    async def get_frame_count(self, video_path, start_timestamp, num_frames, fps=16, output_directory=None, crop=None, decoder=None, timeout=None):
+        """
+        `get_frame_count`: extracts a clip of `num_frames` frames at `fps` from `start_timestamp`.
+
+        Returns:
+            bool: True if FFmpeg succeeded.
+        """
+        output_video_path = _output_path(video_path, start_timestamp, output_directory, os.path.splitext(video_path)[1])
+        try:
+            await self.run_with_fallback(
+                lambda decoder: _frame_count_command(video_path, start_timestamp, 1 / fps * num_frames, output_video_path, crop, decoder),
+                decoder or DecoderOptions(), outputs=[output_video_path], timeout=timeout,
+            )
+        except subprocess.CalledProcessError as e:
+            print(f"Error occurred: {e.stderr.decode()}")
+            return False
+        return True
+
+
+async def _kill(process):
+    if process.returncode is None:
+        try:
+            process.kill()
+        except ProcessLookupError:
+            pass
+        await process.wait()
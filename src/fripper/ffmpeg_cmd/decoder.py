@@ -0,0 +1,106 @@
+import subprocess
+
+from .. import trace
+
+HWACCELS = ("none", "auto", "cuda", "vaapi")
+DEFAULT_VAAPI_DEVICE = "/dev/dri/renderD128"
+
+
+class DecoderOptions:
+    """
+    How FFmpeg should decode a video, shared by every command that decodes frames.
+
+    Args:
+        hwaccel (str, optional): 'none' for software decoding, 'cuda' or 'vaapi' for that
+                        hardware decoder, or 'auto' to let FFmpeg pick whatever is available.
+                        A failing 'cuda' or 'vaapi' decode is retried in software (see
+                        `run_with_fallback`). Defaults to 'none'.
+        threads (int, optional): Decoder and filter thread count. Defaults to FFmpeg's choice.
+        keyframes_only (bool, optional): Decode only keyframes (`-skip_frame nokey`). Much
+                        faster for scanning, an fps filter then repeats the closest keyframe.
+        height (int, optional): Scale decoded frames to this height in the filter graph,
+                        keeping the aspect ratio. Defaults to the source size.
+        vaapi_device (str, optional): The DRM render node used with 'vaapi'.
+
+    Raises:
+        ValueError: If `hwaccel` is not one of HWACCELS.
+    """
+
+    def __init__(self, hwaccel="none", threads=None, keyframes_only=False, height=None, vaapi_device=DEFAULT_VAAPI_DEVICE):
+        if hwaccel not in HWACCELS:
+            raise ValueError(f"Unknown hwaccel: {hwaccel}")
+        self.hwaccel = hwaccel
+        self.threads = threads
+        self.keyframes_only = keyframes_only
+        self.height = height
+        self.vaapi_device = vaapi_device
+
+    @classmethod
+    def from_nvidia(cls, nvidia):
+        # The older nvidia flags map onto the cuda decoder
+        return cls(hwaccel="cuda" if nvidia else "none")
+
+    @property
+    def hardware(self):
+        # Decoders that can fail on machines without the hardware, 'auto' falls back by itself
+        return self.hwaccel in ("cuda", "vaapi")
+
+    def software(self):
+        """The same options with software decoding."""
+        return DecoderOptions("none", self.threads, self.keyframes_only, self.height, self.vaapi_device)
+
+    def input_args(self):
+        """Arguments that go before the `-i` of the input they apply to."""
+        args = []
+        if self.hwaccel == "vaapi":
+            args += ["-hwaccel", "vaapi", "-hwaccel_device", self.vaapi_device]
+        elif self.hwaccel != "none":
+            args += ["-hwaccel", self.hwaccel]
+        if self.threads:
+            args += ["-threads", str(self.threads), "-filter_threads", str(self.threads)]
+        if self.keyframes_only:
+            args += ["-skip_frame", "nokey"]
+        return args
+
+    def scaled_size(self, width, height):
+        """
+        The (width, height) frames come out of the filter graph at. Width is rounded to an
+        even number the same way as FFmpeg's `scale=-2:height`.
+        """
+        if not self.height:
+            return width, height
+        return round(width * self.height / (height * 2)) * 2, self.height
+
+    def filters(self, filters=()):
+        """Appends the scale filter, if any, to a list of video filters."""
+        filters = list(filters)
+        if self.height:
+            filters.append(f"scale=-2:{self.height}")
+        return filters
+
+    def cache_key(self):
+        # Only the options that change the decoded frames
+        settings = []
+        if self.keyframes_only:
+            settings.append("key")
+        if self.height:
+            settings.append(f"h{self.height}")
+        return "_".join(settings)
+
+
+def run_with_fallback(make_command, decoder, outputs=(), **kwargs):
+    """
+    Runs `make_command(decoder)` with `subprocess.run(..., check=True)`, traced with
+    `trace.run` and the given `outputs`. If a hardware decoder was requested and FFmpeg
+    fails, the command is built again with software decoding and run once more.
+
+    Raises:
+        subprocess.CalledProcessError: If FFmpeg fails with software decoding.
+    """
+    try:
+        return trace.run(make_command(decoder), outputs, check=True, **kwargs)
+    except subprocess.CalledProcessError:
+        if not decoder.hardware:
+            raise
+        print(f"{decoder.hwaccel} decoding failed, falling back to software decoding")
+        return trace.run(make_command(decoder.software()), outputs, check=True, **kwargs)
@@ -0,0 +1,52 @@
+import os
+
+from .decoder import DecoderOptions
+
+# Close to FFmpeg's -q:v 2
+JPEG_QUALITY = 95
+
+
+def crop_view(frame, crop):
+    """
+    The region [(x1, y1), (x2, y2)] of a (height, width, channels) frame as a NumPy view of
+    the same memory, nothing is copied. Returns the frame itself without a crop.
+    """
+    if not crop:
+        return frame
+    (x1, y1), (x2, y2) = crop
+    return frame[y1:y2, x1:x2]
+
+
+def write_image(frame, output_path, crop=None, height=None):
+    """
+    Encodes an already decoded BGR frame straight to an image file, the export stage shared
+    by the splitter, the FrameGrabber and `grab_frame` for frames that are in memory.
+
+    The crop is a view into `frame`, so only the crop is read by the encoder and the frame
+    is never copied. Only scaling to `height` makes a new (smaller) array. The format
+    follows the extension of `output_path`, JPEGs are written at JPEG_QUALITY.
+
+    Args:
+        frame (numpy.ndarray): The decoded frame, e.g. a resident frame of the splitter.
+        output_path (str): Where to write the image.
+        crop (list, optional): [(x1, y1), (x2, y2)] region of `frame` to write.
+        height (int, optional): Scale the (cropped) frame to this height, keeping the
+                        aspect ratio.
+
+    Returns:
+        bool: True if the image was written.
+    """
+    import cv2
+
+    image = crop_view(frame, crop)
+    if image.size == 0:
+        print(f"Empty crop {crop}, nothing to write")
+        return False
+    if height and image.shape[0] != height:
+        # Same size as frames scaled by FFmpeg with the same height
+        size = DecoderOptions(height=height).scaled_size(image.shape[1], image.shape[0])
+        image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+    params = []
+    if os.path.splitext(output_path)[1].lower() in (".jpg", ".jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY]
+    return cv2.imwrite(output_path, image, params)
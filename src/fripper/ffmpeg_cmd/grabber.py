@@ -0,0 +1,103 @@
+import math
+import os
+import threading
+
+from .export import write_image
+
+# Seeking restarts decoding from the previous keyframe, reading forward is cheaper for short hops
+MAX_FORWARD_READ_SECONDS = 2.0
+
+_grabbers = {}
+_registry_lock = threading.Lock()
+
+
+class FrameGrabber:
+    """
+    Grabs frames from one video through a persistent cv2.VideoCapture.
+
+    Opening the container and setting up the decoder happens once, every grab after that is a
+    seek (or a short read forward from the last position) on the already open capture,
+    instead of a new FFmpeg process per frame. Safe to use from several threads.
+
+    Args:
+        video_path (str): The path to the video.
+
+    Raises:
+        IOError: If OpenCV can't open the video.
+    """
+
+    def __init__(self, video_path):
+        import cv2
+        self.cv2 = cv2
+        self.video_path = video_path
+        self.capture = cv2.VideoCapture(video_path)
+        if not self.capture.isOpened():
+            raise IOError(f"Could not open video file: {video_path}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 30.0
+        self.frame_count = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.position = 0  # Index of the next frame read() returns
+        self.lock = threading.Lock()
+
+    def read(self, seconds):
+        """
+        Returns the first frame at or after `seconds` as a BGR array, or None if it is past
+        the end of the video.
+        """
+        # Small tolerance so timestamps printed with millisecond precision land on their frame
+        index = max(math.ceil(seconds * self.fps - 1e-3), 0)
+        with self.lock:
+            if not self.position <= index <= self.position + MAX_FORWARD_READ_SECONDS * self.fps:
+                self.capture.set(self.cv2.CAP_PROP_POS_FRAMES, index)
+                self.position = int(self.capture.get(self.cv2.CAP_PROP_POS_FRAMES))
+            while self.position < index:
+                if not self.capture.grab():
+                    return None
+                self.position += 1
+            ok, frame = self.capture.read()
+            if not ok:
+                return None
+            self.position += 1
+            return frame
+
+    def save(self, seconds, output_path, crop=None, height=None):
+        """
+        Writes the frame at `seconds` to `output_path`, cropped to [(x1, y1), (x2, y2)] and
+        then scaled to `height` if given.
+
+        Returns:
+            bool: True if the frame was written.
+        """
+        frame = self.read(seconds)
+        if frame is None:
+            return False
+        return write_image(frame, output_path, crop, height)
+
+    def close(self):
+        with self.lock:
+            self.capture.release()
+
+
+def open_grabber(video_path):
+    """
+    Opens a FrameGrabber for a video and registers it, so `grab_frame` and `grab_frames`
+    use it instead of starting FFmpeg until `close_grabber` is called. Returns the already
+    registered grabber if there is one.
+    """
+    key = os.path.abspath(video_path)
+    with _registry_lock:
+        if key not in _grabbers:
+            _grabbers[key] = FrameGrabber(video_path)
+        return _grabbers[key]
+
+
+def get_grabber(video_path):
+    """The registered FrameGrabber of a video, or None."""
+    with _registry_lock:
+        return _grabbers.get(os.path.abspath(video_path))
+
+
+def close_grabber(video_path):
+    with _registry_lock:
+        grabber = _grabbers.pop(os.path.abspath(video_path), None)
+    if grabber:
+        grabber.close()
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import subprocess
+from fractions import Fraction
+
+from .. import trace
+from .utils import atomic_write
+
+CACHE_DIR = os.environ.get("FRIPPER_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "fripper"))
+
+# Probes already loaded by this process, keyed the same way as the files on disk
+_memory_cache = {}
+
+
+def file_fingerprint(video_path):
+    """
+    Identifies a specific version of a file by its absolute path, size and modification time.
+    Any change to the file gives a different fingerprint, which invalidates cached results.
+
+    Args:
+        video_path (str): The path to the file.
+
+    Returns:
+        str: Hex digest identifying the file.
+    """
+    stat = os.stat(video_path)
+    key = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _cache_path(fingerprint):
+    return os.path.join(CACHE_DIR, "probe", f"{fingerprint}.json")
+
+
+def _load_cached(fingerprint):
+    if fingerprint in _memory_cache:
+        return _memory_cache[fingerprint]
+    try:
+        with open(_cache_path(fingerprint)) as f:
+            info = json.load(f)
+    except (OSError, ValueError):
+        return None
+    _memory_cache[fingerprint] = info
+    return info
+
+
+def _store_cached(fingerprint, info):
+    _memory_cache[fingerprint] = info
+    path = _cache_path(fingerprint)
+    try:
+        # Concurrent readers never see a partial file
+        with atomic_write(path) as f:
+            json.dump(info, f)
+    except OSError as e:
+        print(f"Could not write probe cache: {e}")
+
+
+def _parse_rate(rate):
+    try:
+        return float(Fraction(rate))
+    except (TypeError, ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def _ffprobe_command(video_path):
+    return [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_format",
+        "-show_streams",
+        "-of",
+        "json",
+        video_path
+    ]
+
+
+def _run_ffprobe(video_path):
+    result = trace.run(
+        _ffprobe_command(video_path), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return _parse_ffprobe(result.stdout)
+
+
+def _parse_ffprobe(stdout):
+    data = json.loads(stdout.decode())
+
+    streams = [
+        {
+            "index": stream.get("index"),
+            "type": stream.get("codec_type"),
+            "codec": stream.get("codec_name"),
+        }
+        for stream in data.get("streams", [])
+    ]
+    video = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), {})
+
+    fps = _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate"))
+    duration = float(data.get("format", {}).get("duration") or video.get("duration") or 0.0)
+
+    return {
+        "duration": duration,
+        "fps": fps,
+        "width": int(video.get("width", 0)),
+        "height": int(video.get("height", 0)),
+        "codec": video.get("codec_name"),
+        "frame_count": int(video["nb_frames"]) if video.get("nb_frames", "").isdigit() else None,
+        "streams": streams,
+    }
+
+
+def _keyframe_probe_command(video_path):
+    # Reading packet flags is enough to find keyframes, nothing has to be decoded
+    return [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        video_path
+    ]
+
+
+def _run_keyframe_probe(video_path):
+    result = trace.run(
+        _keyframe_probe_command(video_path), check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    return _parse_keyframes(result.stdout)
+
+
+def _parse_keyframes(stdout):
+    keyframes = []
+    for line in stdout.decode().splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+
+def probe_video(video_path, keyframes=False, cache=True):
+    """
+    Probes a video once for its metadata and caches the result on disk, keyed by the file's
+    path, size and modification time. Later calls for the same unchanged file, from this or
+    any other process, are answered from the cache without starting ffprobe.
+
+    Args:
+        video_path (str): The path to the video file.
+        keyframes (bool, optional): Also build the keyframe index (timestamps in seconds of
+                        every keyframe in the first video stream). This needs a pass over
+                        all packets, so it is only done when asked for and then cached.
+                        Defaults to False.
+        cache (bool, optional): Whether to read and write the cache. Defaults to True.
+
+    Returns:
+        dict: With keys 'duration', 'fps', 'width', 'height', 'codec', 'frame_count' (None
+              when the container does not store it), 'streams' and, when requested,
+              'keyframes'.
+
+    Raises:
+        FileNotFoundError: If the video file does not exist.
+        subprocess.CalledProcessError: If ffprobe fails to read the file.
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"Error: The file '{video_path}' does not exist")
+
+    fingerprint = file_fingerprint(video_path)
+    info = _load_cached(fingerprint) if cache else None
+    updated = False
+
+    if info is None:
+        info = _run_ffprobe(video_path)
+        updated = True
+    if keyframes and "keyframes" not in info:
+        info = dict(info, keyframes=_run_keyframe_probe(video_path))
+        updated = True
+
+    if cache and updated:
+        _store_cached(fingerprint, info)
+    return info
+
+
+def get_keyframes(video_path):
+    return probe_video(video_path, keyframes=True)["keyframes"]
@@ -1,4 +1,26 @@
+import os
+from contextlib import contextmanager
 from datetime import timedelta
+
+
+@contextmanager
+def atomic_write(path, mode="w"):
+    """
+    Opens a temporary file next to `path` for writing and renames it over `path` once the
+    block finishes, so readers and interrupted writers never see a partial file. The
+    temporary file is removed if the block raises.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, mode) as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
 # Function to convert seconds to HH:MM:SS format
 def seconds_to_hms(seconds):
     hours = seconds // 3600
@@ -7,6 +29,13 @@ def seconds_to_hms(seconds):
     # Include milliseconds
     return f"{int(hours):02}:{int(minutes):02}:{secs:06.3f}"
 
+def hms_to_seconds(timestamp):
+    # Accepts 'HH:MM:SS.mmm', 'MM:SS', plain seconds or a number
+    seconds = 0.0
+    for part in str(timestamp).split(":"):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
 def calculate_inner_thumbnail_positions(duration, num_positions):
     dutation = round(duration)
     positions = []
@@ -0,0 +1,118 @@
+import threading
+from collections import OrderedDict
+
+
+class FrameCache:
+    """
+    Memory bounded LRU cache of decoded frames with a background prefetch thread.
+
+    Frames are loaded with `loader(index)` the first time they are requested and kept until
+    the total size of the cached arrays goes over `max_mb`, at which point the least recently
+    used frames are evicted. Every `get` also queues the next `prefetch` frames in the
+    direction the caller is moving so that scrubbing mostly hits the cache.
+
+    Cached arrays are shared, callers that draw on a frame must copy it first.
+
+    Args:
+        loader (callable): Function taking a frame index and returning the decoded frame as
+                        a NumPy array, or None if it could not be loaded.
+        num_frames (int): Number of frames available, indexes outside [0, num_frames) are
+                        never prefetched.
+        max_mb (float, optional): Maximum size of the cached frames in megabytes. Defaults to 512.
+        prefetch (int, optional): Number of frames to load ahead of the requested one.
+                        Defaults to 8. Set to 0 to disable the prefetch thread.
+    """
+
+    def __init__(self, loader, num_frames, max_mb=512, prefetch=8):
+        self.loader = loader
+        self.num_frames = num_frames
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.prefetch = prefetch
+        self.frames = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.last_index = None
+        self.prefetch_target = None
+        self.running = True
+        self.thread = None
+        if self.prefetch > 0:
+            self.thread = threading.Thread(target=self._prefetch_worker, daemon=True)
+            self.thread.start()
+
+    def get(self, index):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+                self.hits += 1
+            else:
+                self.misses += 1
+            direction = 1 if self.last_index is None or index >= self.last_index else -1
+            self.last_index = index
+            if self.prefetch > 0:
+                self.prefetch_target = (index, direction)
+                self.condition.notify()
+
+        if frame is None:
+            frame = self.loader(index)
+            self._put(index, frame)
+        return frame
+
+    def _put(self, index, frame):
+        if frame is None:
+            return
+        with self.lock:
+            if index in self.frames:
+                return
+            self.frames[index] = frame
+            self.size_bytes += frame.nbytes
+            # Always keep the newest frame even if it alone is over the limit
+            while self.size_bytes > self.max_bytes and len(self.frames) > 1:
+                _, evicted = self.frames.popitem(last=False)
+                self.size_bytes -= evicted.nbytes
+
+    def _prefetch_worker(self):
+        while True:
+            with self.condition:
+                while self.running and self.prefetch_target is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                index, direction = self.prefetch_target
+                self.prefetch_target = None
+
+            for offset in range(1, self.prefetch + 1):
+                next_index = index + offset * direction
+                if not 0 <= next_index < self.num_frames:
+                    break
+                with self.lock:
+                    # A newer request makes this run stale, start over from the new position
+                    if self.prefetch_target is not None or not self.running:
+                        break
+                    if next_index in self.frames:
+                        continue
+                self._put(next_index, self.loader(next_index))
+                self.prefetched += 1
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "prefetched": self.prefetched,
+                "frames": len(self.frames),
+                "size_mb": self.size_bytes / (1024 * 1024),
+            }
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join()
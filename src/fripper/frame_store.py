@@ -0,0 +1,146 @@
+import os
+import struct
+
+import numpy as np
+
+from .ffmpeg_cmd import stream_frames, get_video_dimensions, probe_video, file_fingerprint, DecoderOptions, atomic_write
+from .ffmpeg_cmd.probe import CACHE_DIR
+
+MAGIC = b"FRPSTORE"
+VERSION = 1
+# magic, version, frame count, height, width, channels, fps, source fingerprint
+HEADER = struct.Struct("<8sIQIIId40s")
+# Frames start on a page boundary so the memmap offset is aligned
+DATA_OFFSET = 4096
+
+
+class FrameStore:
+    """
+    A single file of fixed-size raw uint8 frames, opened with numpy.memmap.
+
+    The file starts with a DATA_OFFSET byte header holding the frame count, frame shape,
+    fps and the fingerprint of the source video, followed by the frames back to back. Any
+    frame can be read in O(1) without decoding, and the OS page cache keeps recently used
+    frames in memory across sessions.
+
+    Args:
+        path (str): The path to the store file.
+
+    Raises:
+        ValueError: If the file is not a frame store or has an unsupported version.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"Not a frame store: {path}")
+
+        magic, version, frame_count, height, width, channels, fps, fingerprint = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"Not a frame store: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported frame store version {version}: {path}")
+
+        self.frame_count = frame_count
+        self.shape = (height, width, channels)
+        self.fps = fps
+        self.fingerprint = fingerprint.decode()
+        if frame_count:
+            self.frames = np.memmap(path, dtype=np.uint8, mode="r", offset=DATA_OFFSET, shape=(frame_count, *self.shape))
+        else:
+            self.frames = np.zeros((0, *self.shape), dtype=np.uint8)
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, index):
+        # Plain ndarray view of the mapped memory, not an np.memmap
+        return np.asarray(self.frames[index])
+
+    def close(self):
+        # Dropping the reference unmaps the file
+        self.frames = None
+
+
+def store_path_for(video_path, fps=None, start=None, duration=None, size=None, decoder=None):
+    # One store per version of the source file and extraction settings
+    settings = [
+        f"{fps}fps" if fps else "all",
+        start.replace(":", "-") if start else "",
+        f"{duration}s" if duration else "",
+        f"{size[0]}x{size[1]}" if size else "",
+        decoder.cache_key() if decoder else "",
+    ]
+    name = "_".join([file_fingerprint(video_path)] + [setting for setting in settings if setting])
+    return os.path.join(CACHE_DIR, "frames", f"{name}.frames")
+
+
+def build_frame_store(video_path, path, fps=None, start=None, duration=None, size=None, nvidia=False, decoder=None):
+    """
+    Decodes a video once with `stream_frames` and writes every frame into a frame store.
+
+    The store is written to a temporary file next to `path` and renamed when complete, so
+    an interrupted build never leaves a partial store behind.
+
+    Args:
+        video_path (str): The path to the source video.
+        path (str): The path to write the store to.
+        fps (int, optional): The frame rate to extract at. Defaults to every frame.
+        start (str, optional): Timestamp to start extracting from.
+        duration (float, optional): Number of seconds to extract.
+        size (tuple, optional): (width, height) to scale the frames to.
+        nvidia (bool, optional): Whether to use NVIDIA CUDA hardware acceleration.
+        decoder (DecoderOptions, optional): Decoding options, overrides `nvidia` when given.
+
+    Returns:
+        FrameStore: The opened store.
+    """
+    decoder = decoder or DecoderOptions.from_nvidia(nvidia)
+    width, height = size if size else decoder.scaled_size(*get_video_dimensions(video_path))
+    store_fps = fps or probe_video(video_path)["fps"]
+    fingerprint = file_fingerprint(video_path)
+
+    frame_count = 0
+    with atomic_write(path, "wb") as f:
+        f.write(b"\0" * DATA_OFFSET)
+        for frame in stream_frames(video_path, fps=fps, start=start, duration=duration, size=(width, height), decoder=decoder):
+            f.write(frame.data)
+            frame_count += 1
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, frame_count, height, width, 3, float(store_fps), fingerprint.encode()))
+
+    print(f"Stored {frame_count} frames in {path}")
+    return FrameStore(path)
+
+
+def open_frame_store(video_path, path=None, fps=None, start=None, duration=None, size=None, nvidia=False, build=True, decoder=None):
+    """
+    Opens the frame store for a video, building it first if it does not exist yet or was
+    made from a different version of the video.
+
+    Args:
+        path (str, optional): The path of the store. Defaults to a file in the fripper cache
+                        directory named after the video's fingerprint and the settings.
+        build (bool, optional): Build the store when it is missing or stale. If False,
+                        None is returned instead. Defaults to True.
+
+    Returns:
+        FrameStore: The opened store, or None.
+    """
+    if path is None:
+        path = store_path_for(video_path, fps, start, duration, size, decoder)
+
+    if os.path.exists(path):
+        try:
+            store = FrameStore(path)
+            if store.fingerprint == file_fingerprint(video_path):
+                return store
+            print(f"Frame store {path} is out of date")
+        except ValueError as e:
+            print(f"Ignoring frame store: {e}")
+
+    if not build:
+        return None
+    return build_frame_store(video_path, path, fps=fps, start=start, duration=duration, size=size, nvidia=nvidia, decoder=decoder)
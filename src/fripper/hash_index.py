@@ -0,0 +1,217 @@
+import json
+import os
+from itertools import combinations
+
+import cv2
+import numpy as np
+
+from .ffmpeg_cmd import stream_frames, file_fingerprint
+from .ffmpeg_cmd.probe import CACHE_DIR
+from .phash import HASH_FUNCTIONS, HASH_INPUT_SIZE, hamming_distance
+
+DEFAULT_INDEX_PATH = os.path.join(CACHE_DIR, "index")
+# Multi-index hashing: each 64 bit hash is split into 4 chunks of 16 bits. Two hashes within
+# distance r have at least one chunk within distance r // 4, so only entries matching a
+# query chunk (or a chunk a few bits away from it) have to be compared.
+NUM_CHUNKS = 4
+CHUNK_BITS = 64 // NUM_CHUNKS
+# Above this many flipped bits per chunk enumerating neighbours costs more than a full scan
+MAX_CHUNK_RADIUS = 2
+
+
+def _chunk(values, k):
+    shift = np.uint64(CHUNK_BITS * k)
+    return ((np.asarray(values, dtype=np.uint64) >> shift) & np.uint64(0xFFFF)).astype(np.uint16)
+
+
+def _chunk_neighbours(value, radius):
+    neighbours = [int(value)]
+    for flips in range(1, radius + 1):
+        for bits in combinations(range(CHUNK_BITS), flips):
+            mask = 0
+            for bit in bits:
+                mask |= 1 << bit
+            neighbours.append(int(value) ^ mask)
+    return np.array(neighbours, dtype=np.uint16)
+
+
+class HashIndex:
+    """
+    On-disk index of perceptual hashes of sampled frames from many videos.
+
+    Stored as a directory of .npy arrays (hashes, video ids, timestamps and one sorted
+    lookup table per 16 bit chunk) plus videos.json, loaded with mmap so opening an index of
+    millions of hashes costs almost nothing. Lookups use multi-index hashing for small
+    distances and a vectorized popcount scan otherwise.
+
+    Args:
+        path (str, optional): The index directory. Created on `save` if it doesn't exist.
+        method (str, optional): Hash function for a new index, 'phash' or 'dhash'. An
+                        existing index keeps the method it was built with.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_PATH, method="phash"):
+        self.path = path
+        self.method = method
+        self.videos = []
+        self.hashes = np.zeros(0, dtype=np.uint64)
+        self.video_ids = np.zeros(0, dtype=np.uint32)
+        self.timestamps = np.zeros(0, dtype=np.float32)
+        self.tables = None
+
+        metadata_path = os.path.join(path, "videos.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                metadata = json.load(f)
+            self.method = metadata["method"]
+            self.videos = metadata["videos"]
+            self.hashes = np.load(os.path.join(path, "hashes.npy"), mmap_mode="r")
+            self.video_ids = np.load(os.path.join(path, "video_ids.npy"), mmap_mode="r")
+            self.timestamps = np.load(os.path.join(path, "timestamps.npy"), mmap_mode="r")
+            self.tables = [
+                (np.load(os.path.join(path, f"chunk{k}_values.npy"), mmap_mode="r"),
+                 np.load(os.path.join(path, f"chunk{k}_order.npy"), mmap_mode="r"))
+                for k in range(NUM_CHUNKS)
+            ]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def is_indexed(self, video_path):
+        fingerprint = file_fingerprint(video_path)
+        return any(video["fingerprint"] == fingerprint for video in self.videos)
+
+    def add(self, video_path, hashes, timestamps):
+        # Re-indexing a video replaces its old entries
+        path = os.path.abspath(video_path)
+        existing = [i for i, video in enumerate(self.videos) if video["path"] == path]
+        if existing:
+            video_id = existing[0]
+            keep = np.asarray(self.video_ids) != video_id
+        else:
+            video_id = len(self.videos)
+            self.videos.append(None)
+            keep = slice(None)
+        self.videos[video_id] = {"path": path, "fingerprint": file_fingerprint(video_path)}
+
+        self.hashes = np.concatenate([np.asarray(self.hashes)[keep], np.asarray(hashes, dtype=np.uint64)])
+        self.video_ids = np.concatenate([np.asarray(self.video_ids)[keep], np.full(len(hashes), video_id, dtype=np.uint32)])
+        self.timestamps = np.concatenate([np.asarray(self.timestamps)[keep], np.asarray(timestamps, dtype=np.float32)])
+        self.tables = None
+
+    def _build_tables(self):
+        self.tables = []
+        for k in range(NUM_CHUNKS):
+            chunks = _chunk(self.hashes, k)
+            order = np.argsort(chunks, kind="stable").astype(np.uint32)
+            self.tables.append((chunks[order], order))
+
+    def save(self):
+        if self.tables is None:
+            self._build_tables()
+        os.makedirs(self.path, exist_ok=True)
+        arrays = {"hashes": self.hashes, "video_ids": self.video_ids, "timestamps": self.timestamps}
+        for k, (values, order) in enumerate(self.tables):
+            arrays[f"chunk{k}_values"] = values
+            arrays[f"chunk{k}_order"] = order
+        for name, array in arrays.items():
+            np.save(os.path.join(self.path, f"{name}.npy"), np.asarray(array))
+        # Metadata last, an index without it is treated as empty
+        with open(os.path.join(self.path, "videos.json"), "w") as f:
+            json.dump({"method": self.method, "videos": self.videos}, f)
+
+    def _candidates(self, value, max_distance):
+        chunk_radius = max_distance // NUM_CHUNKS
+        if chunk_radius > MAX_CHUNK_RADIUS or len(self) == 0:
+            return None
+        if self.tables is None:
+            self._build_tables()
+
+        found = []
+        for k, (values, order) in enumerate(self.tables):
+            neighbours = _chunk_neighbours(_chunk(value, k), chunk_radius)
+            lefts = np.searchsorted(values, neighbours, side="left")
+            rights = np.searchsorted(values, neighbours, side="right")
+            for left, right in zip(lefts[rights > lefts], rights[rights > lefts]):
+                found.append(order[left:right])
+        if not found:
+            return np.zeros(0, dtype=np.uint32)
+        return np.unique(np.concatenate(found))
+
+    def search(self, value, max_distance=8):
+        """
+        Finds every indexed hash within `max_distance` bits of `value`.
+
+        Returns:
+            list: (video path, timestamp in seconds, distance) tuples, closest first.
+        """
+        candidates = self._candidates(value, max_distance)
+        if candidates is None:
+            candidates = np.arange(len(self))
+        if len(candidates) == 0:
+            return []
+
+        distances = hamming_distance(np.asarray(self.hashes)[candidates], value)
+        matches = candidates[distances <= max_distance]
+        distances = distances[distances <= max_distance]
+        order = np.argsort(distances, kind="stable")
+        return [
+            (self.videos[int(self.video_ids[matches[i]])]["path"], float(self.timestamps[matches[i]]), int(distances[i]))
+            for i in order
+        ]
+
+
+def hash_video(video_path, interval=1.0, method="phash"):
+    """
+    Samples one frame every `interval` seconds and hashes it. Frames are scaled down to
+    HASH_INPUT_SIZE by ffmpeg so the decode pipe only carries thumbnails.
+
+    Returns:
+        tuple: (uint64 array of hashes, float32 array of timestamps in seconds)
+    """
+    hash_function = HASH_FUNCTIONS[method]
+    hashes = [
+        hash_function(frame)
+        for frame in stream_frames(video_path, fps=1 / interval, size=(HASH_INPUT_SIZE, HASH_INPUT_SIZE))
+    ]
+    timestamps = np.arange(len(hashes), dtype=np.float32) * interval
+    return np.array(hashes, dtype=np.uint64), timestamps
+
+
+def index_videos(video_paths, index_path=DEFAULT_INDEX_PATH, interval=1.0, method="phash", force=False):
+    index = HashIndex(index_path, method=method)
+    for video_path in video_paths:
+        if not force and index.is_indexed(video_path):
+            print(f"Already indexed: {video_path}")
+            continue
+        hashes, timestamps = hash_video(video_path, interval, index.method)
+        index.add(video_path, hashes, timestamps)
+        print(f"Indexed {len(hashes)} frames of {video_path}")
+    index.save()
+    print(f"{len(index)} hashes from {len(index.videos)} videos in {index_path}")
+    return index
+
+
+def search_video(query_path, index_path=DEFAULT_INDEX_PATH, max_distance=8, interval=1.0):
+    """
+    Looks up a video (sampled every `interval` seconds) or a single image in the index.
+    Matches against the query video itself are left out.
+
+    Returns:
+        list: (query timestamp, video path, timestamp, distance) tuples.
+    """
+    index = HashIndex(index_path)
+    image = cv2.imread(query_path)
+    if image is not None:
+        hashes = np.array([HASH_FUNCTIONS[index.method](image)], dtype=np.uint64)
+        query_timestamps = np.zeros(1, dtype=np.float32)
+    else:
+        hashes, query_timestamps = hash_video(query_path, interval, index.method)
+
+    query = os.path.abspath(query_path)
+    matches = []
+    for value, query_timestamp in zip(hashes, query_timestamps):
+        for path, timestamp, distance in index.search(value, max_distance):
+            if path != query:
+                matches.append((float(query_timestamp), path, timestamp, distance))
+    return matches
@@ -0,0 +1,118 @@
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .ffmpeg_cmd import get_clip, get_clip_regions, get_frame_count
+
+
+class ClipJobQueue:
+    """
+    Runs clip extraction jobs on a bounded pool of worker threads.
+
+    Each job is an FFmpeg subprocess, so threads are enough to keep several encodes running
+    at once while the caller (e.g. the VideoSplitter UI loop) stays responsive. Progress and
+    failures are printed as jobs finish and kept in `failures`.
+
+    Args:
+        workers (int, optional): Maximum number of jobs running at the same time. Defaults to 2.
+    """
+
+    def __init__(self, workers=2):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failures = []
+
+    def submit(self, description, function, *args, **kwargs):
+        with self.lock:
+            self.submitted += 1
+        future = self.executor.submit(function, *args, **kwargs)
+        future.add_done_callback(lambda f: self._on_done(description, f))
+        return future
+
+    def submit_clip(self, video_path, start_timestamp, end_timestamp, crop=None, output_directory=None, copy=False, decoder=None):
+        description = f"clip {start_timestamp} - {end_timestamp}"
+        return self.submit(description, get_clip, video_path, start_timestamp, end_timestamp,
+                           output_directory=output_directory, crop=crop, copy=copy, decoder=decoder)
+
+    def submit_clip_regions(self, video_path, start_timestamp, end_timestamp, regions, output_directory=None, decoder=None):
+        description = f"{len(regions)} region clips {start_timestamp} - {end_timestamp}"
+        return self.submit(description, get_clip_regions, video_path, start_timestamp, end_timestamp, regions,
+                           output_directory=output_directory, decoder=decoder)
+
+    def submit_frame_count(self, video_path, start_timestamp, num_frames, fps=16, crop=None, output_directory=None, decoder=None):
+        description = f"{num_frames} frames from {start_timestamp}"
+        return self.submit(description, get_frame_count, video_path, start_timestamp, num_frames,
+                           fps=fps, output_directory=output_directory, crop=crop, decoder=decoder)
+
+    def _on_done(self, description, future):
+        error = future.exception()
+        failed = error is not None or future.result() is False
+        with self.lock:
+            self.completed += 1
+            if failed:
+                self.failures.append((description, error))
+            progress = f"[{self.completed}/{self.submitted}]"
+        if failed:
+            print(f"{progress} Failed {description}{f': {error}' if error else ''}")
+        else:
+            print(f"{progress} Finished {description}")
+
+    def pending(self):
+        with self.lock:
+            return self.submitted - self.completed
+
+    def shutdown(self, wait=True):
+        """
+        Stops accepting jobs. With `wait` blocks until every submitted job has finished,
+        otherwise jobs that have not started yet are cancelled.
+
+        Returns:
+            bool: True if no job has failed.
+        """
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+        return not self.failures
+
+
+def load_clip_jobs(jobs_path):
+    """
+    Reads clip jobs from a JSON lines file, one job per line:
+
+        {"start": "00:01:00.000", "end": "00:01:05.000", "crop": [[0, 0], [512, 512]]}
+
+    `crop` is optional. Instead of one crop a job can list named regions, which are all
+    extracted from a single decode of the range (see `get_clip_regions`):
+
+        {"start": "00:01:00.000", "end": "00:01:05.000", "regions": {"left": [[0, 0], [512, 512]], "right": [[512, 0], [1024, 512]]}}
+
+    Empty lines and lines starting with '#' are skipped.
+
+    Returns:
+        list: Dicts with 'start', 'end', 'crop' and 'regions' keys.
+    """
+    jobs = []
+    with open(jobs_path) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                job = json.loads(line)
+                jobs.append({"start": job["start"], "end": job["end"], "crop": job.get("crop"), "regions": job.get("regions")})
+            except (ValueError, KeyError) as e:
+                raise ValueError(f"Invalid clip job on line {line_number} of {jobs_path}: {e}")
+    return jobs
+
+
+def run_clip_jobs(video_path, jobs_path, workers=2, output_directory=None, copy=False, decoder=None):
+    jobs = load_clip_jobs(jobs_path)
+    queue = ClipJobQueue(workers=workers)
+    for job in jobs:
+        if job["regions"]:
+            queue.submit_clip_regions(video_path, job["start"], job["end"], job["regions"], output_directory=output_directory, decoder=decoder)
+        else:
+            queue.submit_clip(video_path, job["start"], job["end"], crop=job["crop"], output_directory=output_directory, copy=copy, decoder=decoder)
+    success = queue.shutdown(wait=True)
+    print(f"{len(jobs) - len(queue.failures)}/{len(jobs)} clips extracted")
+    return success
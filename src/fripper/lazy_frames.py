@@ -0,0 +1,138 @@
+import math
+import os
+import threading
+
+import numpy as np
+
+from .ffmpeg_cmd import stream_frames, get_video_dimensions, get_length_of_video, hms_to_seconds, seconds_to_hms, DecoderOptions
+
+
+class LazyFrames:
+    """
+    The frames of a video at a fixed fps, decoded only when they are first needed.
+
+    The frame count comes from the probed duration, so the sequence is usable right away.
+    Frames live in a sparse memory-mapped file in `directory`, which only takes disk space
+    for frames that have been decoded. Reading a missing frame decodes a short window of
+    `window` frames starting at it with a fast seek, and a background thread fills in the
+    rest. The fill works forward from the last missing frame that was read, so after a jump
+    the frames ahead of the new position come first, then wraps around to whatever is still
+    missing before it. Frames that are already there are never decoded again.
+
+    Args:
+        video_path (str): The path to the video.
+        directory (str): Where to keep the frames file, e.g. a temporary directory.
+        fps (float, optional): The frame rate to extract at. Defaults to 4.
+        start (str, optional): Timestamp to start from.
+        duration (float, optional): Number of seconds to extract. Defaults to the rest of the video.
+        decoder (DecoderOptions, optional): Decoding options, including the output height.
+        window (int, optional): Number of frames decoded per on-demand read. Defaults to 8.
+        fill_limit_mb (float, optional): Only fill in every frame in the background if they
+                        take up at most this many megabytes. Defaults to 4096.
+    """
+
+    def __init__(self, video_path, directory, fps=4, start=None, duration=None, decoder=None, window=8, fill_limit_mb=4096):
+        self.video_path = video_path
+        self.fps = float(fps)
+        self.start_seconds = hms_to_seconds(start) if start else 0.0
+        self.decoder = decoder or DecoderOptions()
+        self.window = window
+
+        if duration is None:
+            duration = get_length_of_video(video_path) - self.start_seconds
+        self.frame_count = max(math.ceil(duration * self.fps - 1e-6), 1)
+        width, height = self.decoder.scaled_size(*get_video_dimensions(video_path))
+        self.shape = (height, width, 3)
+
+        # Sparse file, decoded frames are the only ones that use disk space
+        self.path = os.path.join(directory, "frames.raw")
+        with open(self.path, "wb") as f:
+            f.truncate(self.frame_count * height * width * 3)
+        self.frames = np.memmap(self.path, dtype=np.uint8, mode="r+", shape=(self.frame_count, *self.shape))
+        self.filled = np.zeros(self.frame_count, dtype=bool)
+        self.lock = threading.Lock()
+        self.decoded = 0
+        # Where the background fill continues from, moved to wherever a missing frame is read
+        self.fill_from = 0
+        self.running = True
+
+        self.thread = None
+        if self.frames.nbytes <= fill_limit_mb * 1024 * 1024:
+            self.thread = threading.Thread(target=self._fill_worker, daemon=True)
+            self.thread.start()
+        else:
+            print(f"{self.frames.nbytes / (1024 * 1024):.0f} MB of frames, only decoding them on demand")
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, index):
+        if not self.filled[index]:
+            self._decode(index, self.window)
+            self.fill_from = index
+        return np.asarray(self.frames[index])
+
+    def _store(self, index, frame):
+        with self.lock:
+            if self.filled[index]:
+                return
+            self.frames[index] = frame
+            self.filled[index] = True
+            self.decoded += 1
+
+    def _decode(self, first, count):
+        count = min(count, self.frame_count - first)
+        start = seconds_to_hms(self.start_seconds + first / self.fps)
+        index = first
+        for frame in stream_frames(self.video_path, fps=self.fps, start=start, duration=count / self.fps,
+                                   size=(self.shape[1], self.shape[0]), decoder=self.decoder):
+            if index >= first + count:
+                break
+            self._store(index, frame)
+            index += 1
+        # Past the end of the video (the probed duration can be a little long), keep them black
+        for missing in range(index, first + count):
+            self.filled[missing] = True
+
+    def _next_missing(self, start):
+        # First missing frame at or after `start`, then from the beginning, or None when complete
+        missing = np.flatnonzero(~self.filled[start:])
+        if len(missing):
+            return start + int(missing[0])
+        missing = np.flatnonzero(~self.filled[:start])
+        return int(missing[0]) if len(missing) else None
+
+    def _fill_worker(self):
+        while self.running:
+            fill_from = self.fill_from
+            first = self._next_missing(fill_from)
+            if first is None:
+                return
+            # Decode the stretch up to the next frame that is already there
+            filled = np.flatnonzero(self.filled[first:])
+            end = first + int(filled[0]) if len(filled) else self.frame_count
+            frames = stream_frames(self.video_path, fps=self.fps, start=seconds_to_hms(self.start_seconds + first / self.fps),
+                                   duration=(end - first) / self.fps, size=(self.shape[1], self.shape[0]), decoder=self.decoder)
+            index = first
+            try:
+                for frame in frames:
+                    # Stop when closing, and start over from the new position after a jump
+                    if not self.running or index >= end or self.fill_from != fill_from:
+                        break
+                    self._store(index, frame)
+                    index += 1
+            finally:
+                frames.close()
+            if index < end and self.running and self.fill_from == fill_from:
+                # Past the end of the video (the probed duration can be a little long), keep them black
+                self.filled[index:end] = True
+
+    def progress(self):
+        """Fraction of the frames that have been decoded."""
+        return self.decoded / self.frame_count
+
+    def close(self):
+        self.running = False
+        if self.thread:
+            self.thread.join()
+        self.frames = None
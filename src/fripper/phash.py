@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+
+# Side of the grayscale thumbnail the hashes are computed from, frames can be scaled to this
+# size during decoding so only tiny images leave ffmpeg
+HASH_INPUT_SIZE = 32
+
+
+def _pack_bits(bits):
+    # 64 booleans, most significant bit first, into one uint64
+    return np.packbits(bits.ravel()).view(">u8")[0].astype(np.uint64)
+
+
+def _to_gray(image):
+    if image.ndim == 3:
+        return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return image
+
+
+def dhash(image):
+    """
+    Difference hash: whether each pixel of a 9x8 thumbnail is brighter than its left
+    neighbour. Cheap and robust to scaling and re-encoding.
+
+    Returns:
+        numpy.uint64: The 64 bit hash.
+    """
+    small = cv2.resize(_to_gray(image), (9, 8), interpolation=cv2.INTER_AREA)
+    return _pack_bits(small[:, 1:] > small[:, :-1])
+
+
+def phash(image):
+    """
+    Perceptual hash: the sign of the lowest 8x8 DCT coefficients of a 32x32 thumbnail
+    compared to their median. Slower than dhash but more robust to brightness, contrast and
+    compression changes.
+
+    Returns:
+        numpy.uint64: The 64 bit hash.
+    """
+    small = cv2.resize(_to_gray(image), (HASH_INPUT_SIZE, HASH_INPUT_SIZE), interpolation=cv2.INTER_AREA)
+    low_frequencies = cv2.dct(small.astype(np.float32))[:8, :8]
+    # The DC term only reflects overall brightness, leave it out of the median
+    median = np.median(low_frequencies.ravel()[1:])
+    return _pack_bits(low_frequencies > median)
+
+
+HASH_FUNCTIONS = {
+    "dhash": dhash,
+    "phash": phash,
+}
+
+
+def popcount(values):
+    """Number of set bits in each element of a uint64 array."""
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return table[values.reshape(-1, 1).view(np.uint8)].sum(axis=1, dtype=np.uint8).reshape(values.shape)
+
+
+def hamming_distance(hashes, value):
+    return popcount(np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(value)))
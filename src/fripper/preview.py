@@ -1,6 +1,8 @@
 import tempfile
 import os
+import math
 import cv2
+import numpy as np
 from .ffmpeg_cmd import grab_frame, grab_thumbnails, seconds_to_hms, calculate_inner_thumbnail_positions
 
 
@@ -21,21 +23,22 @@ def preview_frame(video_path, start=None):
         if key == ord('q'):
             cv2.destroyAllWindows()
 
-def preview_thumbnails(video_path):
+def preview_thumbnails(video_path, num_thumbnails=4):
     with tempfile.TemporaryDirectory() as temp_dir:
-        image_paths = grab_thumbnails(video_path, temp_dir)
+        image_paths = grab_thumbnails(video_path, temp_dir, num_thumbnails)
         images = [cv2.imread(path) for path in image_paths]
+        images = [image for image in images if image is not None]
         width, height = images[0].shape[1], images[0].shape[0]
-        width = width // 2
-        height = height // 2
-        resized_images = [cv2.resize(image, (width, height)) for image in images]
 
-        top_row = cv2.hconcat(resized_images[:2])
-        bottom_row = cv2.hconcat(resized_images[2:])
+        # Square-ish contact sheet, 2x2 for the default 4 thumbnails
+        columns = math.ceil(math.sqrt(len(images)))
+        rows = math.ceil(len(images) / columns)
+        width = max(width // columns, 1)
+        height = max(height // columns, 1)
+        resized_images = [cv2.resize(image, (width, height)) for image in images]
+        resized_images += [np.zeros_like(resized_images[0])] * (rows * columns - len(resized_images))
 
-        stitched_image = cv2.vconcat([top_row, bottom_row])
+        stitched_image = cv2.vconcat([cv2.hconcat(resized_images[row * columns:(row + 1) * columns]) for row in range(rows)])
         cv2.imshow('Stitched Image', stitched_image)
         cv2.waitKey(0)
         cv2.destroyAllWindows()
-
-
@@ -0,0 +1,115 @@
+import json
+
+import cv2
+import numpy as np
+
+from .deduper import histogram_correlation
+from .ffmpeg_cmd import stream_frames, probe_video, seconds_to_hms, DecoderOptions
+
+# Frames are compared at this height, cuts don't need more detail and decoding stays cheap
+SCENE_HEIGHT = 144
+HISTOGRAM_BINS = 32
+# Frames on each side of a score that the adaptive threshold is computed from
+ADAPTIVE_WINDOW = 30
+# Scale of the median absolute deviation to a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+
+def color_histogram(frame, bins=HISTOGRAM_BINS):
+    """The normalized histograms of the three channels, concatenated."""
+    hists = [cv2.calcHist([frame], [channel], None, [bins], [0, 256]) for channel in range(3)]
+    hist = np.concatenate(hists).ravel()
+    return cv2.normalize(hist, hist).ravel()
+
+
+def scene_scores(video_path, fps=None, height=SCENE_HEIGHT, decoder=None):
+    """
+    Decodes a downscaled stream of the video and scores how different each frame is from
+    the one before it, as 1 - the histogram correlation (see `histogram_correlation`).
+
+    Args:
+        fps (float, optional): Sample the video at this rate. Defaults to every frame.
+        height (int, optional): Height frames are decoded at. Defaults to SCENE_HEIGHT.
+        decoder (DecoderOptions, optional): Hardware decoding and threads.
+
+    Returns:
+        tuple: (scores, frame rate of the scores). scores[i] compares frame i + 1 with frame i.
+    """
+    decoder = decoder or DecoderOptions()
+    decoder = DecoderOptions(decoder.hwaccel, decoder.threads, height=height, vaapi_device=decoder.vaapi_device)
+    rate = fps or probe_video(video_path)["fps"]
+
+    hists = np.array([color_histogram(frame) for frame in stream_frames(video_path, fps=fps, decoder=decoder)], dtype=np.float32)
+    if len(hists) < 2:
+        return np.zeros(0), rate
+    return 1 - histogram_correlation(hists[:-1], hists[1:]), rate
+
+
+def adaptive_threshold(scores, window=ADAPTIVE_WINDOW, sensitivity=6.0, min_score=0.15):
+    """
+    Per-score threshold of the local median plus `sensitivity` robust standard deviations
+    (from the median absolute deviation) over `window` scores on each side, and never below
+    `min_score`. Follows the usual level of change, so handheld or noisy footage needs a
+    bigger jump to count as a cut than a static shot.
+    """
+    if len(scores) == 0:
+        return np.zeros(0)
+    padded = np.pad(scores, window, mode="reflect" if len(scores) > window else "edge")
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)
+    median = np.median(windows, axis=1)
+    mad = np.median(np.abs(windows - median[:, None]), axis=1)
+    return np.maximum(median + sensitivity * MAD_SCALE * mad, min_score)
+
+
+def detect_cuts(scores, rate, sensitivity=6.0, min_score=0.15, min_scene_seconds=0.5):
+    """
+    Finds the shot boundaries in `scene_scores` output.
+
+    A cut is a score above its adaptive threshold that is also the highest score within
+    `min_scene_seconds` on either side, so a transition spread over several frames is one cut.
+
+    Returns:
+        list: Cut times in seconds, each the start of a new shot.
+    """
+    if len(scores) == 0:
+        return []
+    threshold = adaptive_threshold(scores, sensitivity=sensitivity, min_score=min_score)
+    gap = max(int(min_scene_seconds * rate), 1)
+
+    padded = np.pad(scores, gap, mode="constant", constant_values=-1)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * gap + 1).max(axis=1)
+    candidates = np.flatnonzero((scores > threshold) & (scores >= local_max))
+
+    cuts = []
+    for index in candidates:
+        # Equal maxima in one window (e.g. a flash) only count once
+        if cuts and index - cuts[-1] <= gap:
+            continue
+        cuts.append(int(index))
+    # Score i compares frame i + 1 with frame i, the new shot starts at frame i + 1
+    return [(index + 1) / rate for index in cuts]
+
+
+def detect_scenes(video_path, fps=None, height=SCENE_HEIGHT, sensitivity=6.0, min_score=0.15, min_scene_seconds=0.5, decoder=None):
+    """
+    Detects the shot boundaries of a video. Runs on a SCENE_HEIGHT decode, so it is well
+    faster than realtime on a CPU.
+
+    Returns:
+        list: Cut times in seconds, each the start of a new shot.
+    """
+    scores, rate = scene_scores(video_path, fps=fps, height=height, decoder=decoder)
+    return detect_cuts(scores, rate, sensitivity=sensitivity, min_score=min_score, min_scene_seconds=min_scene_seconds)
+
+
+def scene_segments(cuts, duration):
+    """The (start, end) seconds of each shot between the cuts, covering the whole video."""
+    boundaries = [0.0] + [cut for cut in cuts if 0 < cut < duration] + [duration]
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def write_scene_jobs(segments, jobs_path):
+    """Writes one clip job per segment, in the JSON lines format of `fripper clips`."""
+    with open(jobs_path, "w") as f:
+        for start, end in segments:
+            f.write(json.dumps({"start": seconds_to_hms(start), "end": seconds_to_hms(end)}) + "\n")
@@ -4,46 +4,104 @@ import cv2
 import subprocess
 import platform
 import signal
-import threading
-import imghdr
 import shutil
-from PIL import Image
-from .ffmpeg_cmd import rip_frames, grab_frame, seconds_to_hms, subtract_seconds, add_timestamps, get_clip, add_seconds, get_frame_count
-
-def is_image(file_path):
-    return imghdr.what(file_path) is not None
+import threading
+from bisect import bisect_left, bisect_right
+from .frame_cache import FrameCache
+from .frame_store import open_frame_store
+from .jobs import ClipJobQueue
+from .lazy_frames import LazyFrames
+from .ffmpeg_cmd import rip_frames, stream_frames, grab_frame, seconds_to_hms, hms_to_seconds, subtract_seconds, add_timestamps, add_seconds, DecoderOptions, get_video_dimensions, open_grabber, close_grabber, write_image, grab_frame_regions, START_DURATION
 
-def crop_image(image_path, top_left, bottom_right):
-    img = Image.open(image_path)
+# Leading bytes of the image formats OpenCV reads, (offset, signature)
+IMAGE_SIGNATURES = (
+    (0, b"\xff\xd8\xff"),  # JPEG
+    (0, b"\x89PNG\r\n\x1a\n"),
+    (0, b"GIF87a"),
+    (0, b"GIF89a"),
+    (0, b"BM"),
+    (0, b"II*\x00"),  # TIFF, little endian
+    (0, b"MM\x00*"),  # TIFF, big endian
+    (8, b"WEBP"),  # After the RIFF header
+    (0, b"v/1\x01"),  # OpenEXR
+)
 
-    crop_box = (top_left[0], top_left[1], bottom_right[0], bottom_right[1])
+def is_image(file_path):
+    """Sniffs the first bytes of the file for a known image signature."""
+    try:
+        with open(file_path, "rb") as f:
+            header = f.read(16)
+    except OSError:
+        return False
+    if header[:2] in (b"P1", b"P2", b"P3", b"P4", b"P5", b"P6") and header[2:3].isspace():
+        return True  # Netpbm
+    return any(header[offset:offset + len(signature)] == signature for offset, signature in IMAGE_SIGNATURES)
 
-    cropped_img = img.crop(crop_box)
+def crop_image(image_path, top_left, bottom_right, image=None):
+    # Crops the already loaded image when given, reading the file only if it isn't
+    if image is None:
+        image = cv2.imread(image_path, cv2.IMREAD_UNCHANGED)
     basename = os.path.splitext(os.path.basename(image_path))[0]
-
-    cropped_img.save(basename + "_cropped.png")  # Save the cropped image
+    write_image(image, basename + "_cropped.png", [top_left, bottom_right])  # Save the cropped image
 
 class VideoSplitter:
-    def __init__(self, video_path, fps=4, start=None, nvidia=False):
+    def __init__(self, video_path, fps=4, start=None, nvidia=False, stream=False, cache_mb=512, prefetch=8, clip_workers=2, copy=False, store=False, decoder=None, proxy_height=None, rip=False, scenes=False):
         self.video_path = video_path
         self.fps = fps
         self.start = start
         self.nvidia = nvidia
+        self.decoder = decoder or DecoderOptions.from_nvidia(nvidia)
+        # Grabs and clips decode every frame at full size, only hardware and threads carry over
+        self.export_decoder = DecoderOptions(self.decoder.hwaccel, self.decoder.threads, vaapi_device=self.decoder.vaapi_device)
+        self.proxy_height = proxy_height
+        # Source pixels per displayed pixel, crops are mapped back with these when exporting
+        self.scale_x = 1.0
+        self.scale_y = 1.0
+        self.source_size = None
+        self.stream = stream
         self.temp_dir = tempfile.TemporaryDirectory()
         self.frame_files = []
+        self.frames = []
+        self.cache_mb = cache_mb
+        self.prefetch = prefetch
+        self.cache = None
+        self.jobs = ClipJobQueue(workers=clip_workers)
+        self.copy = copy
+        self.store = store
+        self.rip = rip
+        self.scenes = scenes
+        self.cut_frames = None  # Frame indexes where shots start, once detection has finished
         self.total_frames = 0
         self.current_frame = 0
         self.start_timestamp = None
         self.end_timestamp = None
         self.rect_start_point = None
         self.rect_end_point = None
+        # Named crop boxes in display coordinates, exported together from one decode when set
+        self.regions = {}
+        self.regions_added = 0
         self.drawing = False
         self.running = True
 
     def setup(self):
-        if not is_image(self.video_path):
+        # Only a short window after --start is extracted, the full video without it
+        duration = START_DURATION if self.start else None
+        if not is_image(self.video_path) and self.proxy_height:
+            self.setup_proxy()
+        if not is_image(self.video_path) and self.store:
+            print("its a video, opening frame store")
+            self.frames = open_frame_store(self.video_path, fps=self.fps, start=self.start, duration=duration, decoder=self.decoder)
+        elif not is_image(self.video_path) and self.stream:
+            print("its a video, streaming frames into memory")
+            for frame in stream_frames(self.video_path, fps=self.fps, start=self.start, duration=duration, decoder=self.decoder):
+                self.frames.append(frame.copy())
+        elif not is_image(self.video_path) and not self.rip:
+            print("its a video, decoding frames on demand")
+            self.frames = LazyFrames(self.video_path, self.temp_dir.name, fps=self.fps, start=self.start, duration=duration, decoder=self.decoder)
+        elif not is_image(self.video_path):
             print("its a video")
-            rip_frames(self.video_path, self.temp_dir.name, "frame_%05d.jpg", fps=self.fps, start=self.start)
+            rip_frames(self.video_path, self.temp_dir.name, "frame_%05d.jpg", fps=self.fps, start=self.start, decoder=self.decoder,
+                       duration=duration)
         else:
             print("Its an image")
             try:
@@ -52,10 +110,21 @@ class VideoSplitter:
             except Exception as e:
                 print(f"Error occurred: {e}")
 
+        if not is_image(self.video_path):
+            # Keeps the video open so every 's' grab is a seek instead of a new ffmpeg process
+            try:
+                open_grabber(self.video_path)
+            except IOError as e:
+                print(f"Grabbing frames with ffmpeg: {e}")
+
         self.frame_files = sorted(os.listdir(self.temp_dir.name))
-        self.total_frames = len(self.frame_files)
+        self.total_frames = self.num_loaded_frames()
         if is_image(self.video_path):
             self.total_frames = 2
+        elif self.scenes:
+            threading.Thread(target=self.detect_cuts, daemon=True).start()
+        if not self.frames:
+            self.cache = FrameCache(self.load_frame_file, len(self.frame_files), max_mb=self.cache_mb, prefetch=self.prefetch)
 
         cv2.namedWindow("Frame Viewer", cv2.WINDOW_NORMAL)
         if platform.system() == "Linux":
@@ -65,21 +134,100 @@ class VideoSplitter:
         cv2.createTrackbar("Frame", "Frame Viewer", 0, self.total_frames - 1, self.on_trackbar)
         self.show_frame(self.current_frame)
 
+    def setup_proxy(self):
+        # Decode at the preview height, the source is only touched again when exporting
+        source_width, source_height = get_video_dimensions(self.video_path)
+        if self.proxy_height >= source_height:
+            print(f"Video is only {source_height}p, not using a proxy")
+            return
+        decoder = self.decoder
+        self.decoder = DecoderOptions(decoder.hwaccel, decoder.threads, decoder.keyframes_only, self.proxy_height, decoder.vaapi_device)
+        proxy_width, proxy_height = self.decoder.scaled_size(source_width, source_height)
+        self.scale_x = source_width / proxy_width
+        self.scale_y = source_height / proxy_height
+        self.source_size = (source_width, source_height)
+        print(f"Using a {proxy_width}x{proxy_height} proxy of the {source_width}x{source_height} video")
+
+    def source_crop(self):
+        """The crop rectangle in source video coordinates, or None if there is none."""
+        if not (self.rect_start_point and self.rect_end_point):
+            return None
+        return self.to_source([self.rect_start_point, self.rect_end_point])
+
+    def source_regions(self):
+        """The named regions in source video coordinates."""
+        return {name: self.to_source(box) for name, box in self.regions.items()}
+
+    def add_region(self):
+        if not (self.rect_start_point and self.rect_end_point):
+            print("Draw a crop box first")
+            return
+        self.regions_added += 1
+        name = f"r{self.regions_added}"
+        self.regions[name] = [self.rect_start_point, self.rect_end_point]
+        self.rect_start_point = None
+        self.rect_end_point = None
+        print(f"Added region {name}, {len(self.regions)} regions are exported together")
+
+    def export_frame_count(self, num_frames=33, fps=16):
+        if self.regions:
+            # Same duration as get_frame_count, one clip per region from a single decode
+            end_timestamp = add_seconds(self.start_timestamp, num_frames / fps)
+            self.jobs.submit_clip_regions(self.video_path, self.start_timestamp, end_timestamp,
+                                          self.source_regions(), decoder=self.export_decoder)
+        else:
+            self.jobs.submit_frame_count(self.video_path, self.start_timestamp, num_frames, fps=fps,
+                                         crop=self.source_crop(), decoder=self.export_decoder)
+
+    def to_source(self, box):
+        if self.scale_x == 1.0 and self.scale_y == 1.0:
+            return list(box)
+        (x1, y1), (x2, y2) = box
+        source_width, source_height = self.source_size
+        return [
+            (min(round(x1 * self.scale_x), source_width), min(round(y1 * self.scale_y), source_height)),
+            (min(round(x2 * self.scale_x), source_width), min(round(y2 * self.scale_y), source_height)),
+        ]
+
+    def detect_cuts(self):
+        from .scenes import detect_scenes
+        print("Detecting scene cuts in the background")
+        start_seconds = hms_to_seconds(self.start) if self.start else 0.0
+        cuts = detect_scenes(self.video_path, decoder=self.export_decoder)
+        frames = (round((cut - start_seconds) * float(self.fps)) for cut in cuts)
+        self.cut_frames = sorted({frame for frame in frames if 0 < frame < self.total_frames})
+        print(f"Found {len(self.cut_frames)} scene cuts, jump between them with n and p")
+
+    def jump_to_cut(self, direction):
+        if self.cut_frames is None:
+            print("Still detecting scene cuts")
+            return
+        if direction > 0:
+            index = bisect_right(self.cut_frames, self.current_frame)
+            if index < len(self.cut_frames):
+                self.current_frame = self.cut_frames[index]
+        else:
+            index = bisect_left(self.cut_frames, self.current_frame) - 1
+            self.current_frame = self.cut_frames[index] if index >= 0 else 0
+
     def mouse_callback(self, event, x, y, flags, param):
         shift_held = flags & cv2.EVENT_FLAG_SHIFTKEY  # Check if Shift is held
+        # Shift draws a 512x512 box in source pixels, whatever size the frames are shown at
+        box_width = round(512 / self.scale_x)
+        box_height = round(512 / self.scale_y)
         if event == cv2.EVENT_LBUTTONDOWN:
             self.rect_start_point = (x, y)
             self.drawing = True
         elif event == cv2.EVENT_MOUSEMOVE and self.drawing:
             if shift_held:
-                self.rect_end_point = (self.rect_start_point[0] + 512, self.rect_start_point[1] + 512)
+                self.rect_end_point = (self.rect_start_point[0] + box_width, self.rect_start_point[1] + box_height)
             else:
                 self.rect_end_point = (x, y)
             self.show_frame(self.current_frame)
         elif event == cv2.EVENT_LBUTTONUP:
             if shift_held:
-                x = self.rect_start_point[0] + 512
-                y = self.rect_start_point[1] + 512
+                x = self.rect_start_point[0] + box_width
+                y = self.rect_start_point[1] + box_height
             if x > self.width:
                 x = self.width
             elif x < 0:
@@ -96,16 +244,39 @@ class VideoSplitter:
             self.rect_end_point = (max(x1, x2), max(y1, y2))
             self.drawing = False
             print(f"{self.rect_start_point} {self.rect_end_point}")
+            if self.scale_x != 1.0 or self.scale_y != 1.0:
+                print(f"Source crop: {self.source_crop()}")
             self.show_frame(self.current_frame)
 
+    def num_loaded_frames(self):
+        return len(self.frames) if self.frames else len(self.frame_files)
+
+    def load_frame_file(self, frame_index):
+        frame_path = os.path.join(self.temp_dir.name, self.frame_files[frame_index])
+        return cv2.imread(frame_path)
+
+    def resident_frame(self, frame_index):
+        """The decoded frame in memory if exports can use it as is (full resolution, not keyframes only), else None."""
+        if not self.frames or self.scale_x != 1.0 or self.scale_y != 1.0 or self.decoder.keyframes_only:
+            return None
+        return self.frames[frame_index]
+
+    def read_frame(self, frame_index):
+        # Copy so the overlay drawn by show_frame does not end up in the stored/cached frame
+        if self.frames:
+            return self.frames[frame_index].copy()
+        return self.cache.get(frame_index).copy()
+
     def show_frame(self, frame_index):
-        if 0 <= frame_index < len(self.frame_files):
-            frame_path = os.path.join(self.temp_dir.name, self.frame_files[frame_index])
-            image = cv2.imread(frame_path)
+        if 0 <= frame_index < self.num_loaded_frames():
+            image = self.read_frame(frame_index)
             self.height, self.width = image.shape[:2]
 
             if self.rect_start_point and self.rect_end_point:
                 cv2.rectangle(image, self.rect_start_point, self.rect_end_point, (0, 255, 0), 2)
+            for name, (top_left, bottom_right) in self.regions.items():
+                cv2.rectangle(image, top_left, bottom_right, (255, 128, 0), 2)
+                cv2.putText(image, name, (top_left[0] + 5, top_left[1] + 25), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 128, 0), 2, cv2.LINE_AA)
 
             text = f"Frame: {frame_index + 1}/{self.total_frames}"
             image = cv2.putText(image, text, (30, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2, cv2.LINE_AA)
@@ -137,10 +308,20 @@ class VideoSplitter:
                     timestamp = seconds_to_hms(self.current_frame / int(self.fps))
                     if self.start:
                         timestamp = add_timestamps(timestamp, self.start)
-                    grab_frame(self.video_path, timestamp, crop=[self.rect_start_point, self.rect_end_point] if self.rect_start_point and self.rect_end_point else None)
+                    if self.regions:
+                        grab_frame_regions(self.video_path, timestamp, self.source_regions(),
+                                           decoder=self.export_decoder, frame=self.resident_frame(self.current_frame))
+                    else:
+                        grab_frame(self.video_path, timestamp, crop=self.source_crop(),
+                                   decoder=self.export_decoder, frame=self.resident_frame(self.current_frame))
+                elif self.regions:
+                    basename = os.path.splitext(os.path.basename(self.video_path))[0]
+                    image = self.cache.get(0)
+                    for name, region in self.regions.items():
+                        write_image(image, f"{basename}_{name}.png", region)
                 else:
                     if self.rect_start_point and self.rect_end_point:
-                        crop_image(self.video_path, self.rect_start_point, self.rect_end_point)
+                        crop_image(self.video_path, self.rect_start_point, self.rect_end_point, self.cache.get(0))
                     else:
                         print("No crop box for image, skipping")
 
@@ -151,38 +332,55 @@ class VideoSplitter:
             elif key == ord(']'):
                 self.end_timestamp = seconds_to_hms(self.current_frame / int(self.fps))
                 print(f"End timestamp: {self.end_timestamp}")
+            elif key == ord('c') and self.start_timestamp and self.end_timestamp and self.regions:
+                self.jobs.submit_clip_regions(self.video_path, self.start_timestamp, self.end_timestamp,
+                                              self.source_regions(), decoder=self.export_decoder)
             elif key == ord('c') and self.start_timestamp and self.end_timestamp:
-                def extract_clip():
-                    result = get_clip(self.video_path, self.start_timestamp, self.end_timestamp, 
-                                    crop=[self.rect_start_point, self.rect_end_point] if self.rect_start_point and self.rect_end_point else None)
-                    print(result)
-
-                threading.Thread(target=extract_clip, daemon=True).start()
-
-                # result = get_clip(self.video_path, self.start_timestamp, self.end_timestamp, crop=[self.rect_start_point, self.rect_end_point] if self.rect_start_point and self.rect_end_point else None)
-                # print(result)
+                self.jobs.submit_clip(self.video_path, self.start_timestamp, self.end_timestamp,
+                                      crop=self.source_crop(),
+                                      copy=self.copy, decoder=self.export_decoder)
             elif key == ord('t') and self.start_timestamp:
-                def extract_clip():
-                    result = get_frame_count(self.video_path, self.start_timestamp, 33, fps=16, crop=[self.rect_start_point, self.rect_end_point] if self.rect_start_point and self.rect_end_point else None)
-
-                    print(result)
-                threading.Thread(target=extract_clip, daemon=True).start()
+                self.export_frame_count()
             elif key == ord('o') and self.start_timestamp:
+                # Overlapping 5 second windows every 4 seconds, encoded by the job queue in the background
                 for _ in range(20):
-                    result = get_clip(self.video_path, self.start_timestamp, add_seconds(self.start_timestamp, 5))
-                    print(result)
+                    self.jobs.submit_clip(self.video_path, self.start_timestamp, add_seconds(self.start_timestamp, 5), copy=self.copy,
+                                          decoder=self.export_decoder)
                     self.start_timestamp = add_seconds(self.start_timestamp, 4)
             elif key == ord(' '):
                 timestamp = seconds_to_hms(self.current_frame / int(self.fps))
                 shifted_timestamp = subtract_seconds(timestamp, 1)
-                subprocess.Popen(['fripper', 'split', self.video_path, "--fps", "60", "--start", shifted_timestamp])
+                command = ['fripper', 'split', self.video_path, "--fps", "60", "--start", shifted_timestamp]
+                if self.proxy_height:
+                    command += ["--proxy-height", str(self.proxy_height)]
+                subprocess.Popen(command)
+            elif key == ord('n'):
+                self.jump_to_cut(1)
+            elif key == ord('p'):
+                self.jump_to_cut(-1)
             elif key == ord('d'):
                 self.rect_start_point = None
                 self.rect_end_point = None
                 print("Crop box deleted")
+            elif key == ord('r'):
+                self.add_region()
+            elif key == ord('x'):
+                self.regions.clear()
+                print("Regions deleted")
             self.show_frame(self.current_frame)
             cv2.setTrackbarPos("Frame", "Frame Viewer", self.current_frame)
         cv2.destroyAllWindows()
+        if self.jobs.pending():
+            print(f"Waiting for {self.jobs.pending()} clip jobs to finish...")
+        self.jobs.shutdown(wait=True)
+        if self.cache:
+            stats = self.cache.stats()
+            print(f"Frame cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%}), "
+                  f"{stats['prefetched']} prefetched, {stats['frames']} frames / {stats['size_mb']:.1f} MB cached")
+            self.cache.close()
+        if isinstance(self.frames, LazyFrames):
+            self.frames.close()
+        close_grabber(self.video_path)
         self.temp_dir.cleanup()
 
 
@@ -0,0 +1,202 @@
+import atexit
+import json
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+FORMATS = ("chrome", "jsonl")
+
+_tracer = None
+
+
+class Tracer:
+    """
+    Collects timing events and writes them to `path`.
+
+    'jsonl' writes one JSON object per event as soon as it is recorded, so a trace of a run
+    that crashes or is killed still has everything up to that point. 'chrome' writes a
+    Trace Event Format file when the tracer is closed, which can be opened in
+    chrome://tracing or Perfetto.
+
+    Only events from the process that created the tracer are recorded, worker processes
+    that inherit it by forking are ignored.
+    """
+
+    def __init__(self, path, format="jsonl"):
+        if format not in FORMATS:
+            raise ValueError(f"Unknown trace format: {format}")
+        self.path = path
+        self.format = format
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.lock = threading.Lock()
+        self.file = open(path, "w") if format == "jsonl" else None
+
+    def emit(self, name, category, start, duration, args):
+        if os.getpid() != self.pid:
+            return
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self.origin) * 1e6),
+            "dur": round(duration * 1e6),
+            "pid": self.pid,
+            "tid": threading.get_native_id(),
+            "args": args,
+        }
+        with self.lock:
+            if self.file:
+                self.file.write(json.dumps(event) + "\n")
+                self.file.flush()
+            else:
+                self.events.append(event)
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.file.close()
+                self.file = None
+            elif self.format == "chrome" and os.getpid() == self.pid:
+                with open(self.path, "w") as f:
+                    json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+def enable_tracing(path, format=None):
+    """
+    Starts recording trace events to `path` until `disable_tracing` is called or the
+    interpreter exits. The format defaults to 'chrome' for a .json path and 'jsonl'
+    otherwise.
+    """
+    global _tracer
+    disable_tracing()
+    if format is None:
+        format = "chrome" if path.endswith(".json") else "jsonl"
+    _tracer = Tracer(path, format)
+    atexit.register(disable_tracing)
+    return _tracer
+
+
+def disable_tracing():
+    global _tracer
+    if _tracer:
+        _tracer.close()
+        _tracer = None
+
+
+def tracing_enabled():
+    return _tracer is not None
+
+
+def children_cpu():
+    """User and system CPU seconds of all waited-for child processes so far."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def span(name, category="stage", **args):
+    """
+    Records the wall and CPU time of the block as one event. Yields the dict of event
+    arguments, so the block can add results like byte counts to it. Costs nothing beyond
+    the `with` when tracing is off.
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    try:
+        yield args
+    finally:
+        duration = time.perf_counter() - start
+        args["wall_s"] = duration
+        args["cpu_s"] = time.thread_time() - cpu_start
+        tracer.emit(name, category, start, duration, args)
+
+
+class Timer:
+    """
+    Sums many short timings (e.g. writing single frames) into one event, for work too fine
+    grained for a span each. The event covers the first to the last measurement.
+    """
+
+    def __init__(self, name, category="stage"):
+        self.name = name
+        self.category = category
+        self.first = None
+        self.last = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.count = 0
+
+    def __enter__(self):
+        if _tracer is not None:
+            self.start = time.perf_counter()
+            self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if _tracer is None:
+            return
+        end = time.perf_counter()
+        if self.first is None:
+            self.first = self.start
+        self.last = end
+        self.wall += end - self.start
+        self.cpu += time.thread_time() - self.cpu_start
+        self.count += 1
+
+    def emit(self, **args):
+        if _tracer is None or self.first is None:
+            return
+        args.update({"wall_s": self.wall, "cpu_s": self.cpu, "count": self.count})
+        _tracer.emit(self.name, self.category, self.first, self.last - self.first, args)
+
+
+def _size(path):
+    # A directory counts as all the files directly in it, e.g. extracted frames
+    if os.path.isdir(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def run(command, outputs=(), **kwargs):
+    """
+    subprocess.run that records the command, wall time, CPU time of the child, bytes
+    written (captured stdout plus the size of the files or directories in `outputs`) and
+    exit status when tracing.
+
+    Child CPU time comes from RUSAGE_CHILDREN, so it also counts other subprocesses that
+    finish at the same time, e.g. parallel clip jobs.
+    """
+    if _tracer is None:
+        return subprocess.run(command, **kwargs)
+
+    with span(os.path.basename(command[0]), "subprocess", command=" ".join(map(str, command))) as args:
+        children_start = children_cpu()
+        result = None
+        try:
+            result = subprocess.run(command, **kwargs)
+            args["returncode"] = result.returncode
+            return result
+        except subprocess.CalledProcessError as e:
+            args["returncode"] = e.returncode
+            raise
+        finally:
+            args["child_cpu_s"] = children_cpu() - children_start
+            written = sum(_size(path) for path in outputs)
+            if result is not None and isinstance(result.stdout, bytes):
+                written += len(result.stdout)
+            args["bytes_written"] = written
@@ -0,0 +1,22 @@
+import shutil
+import subprocess
+
+import pytest
+
+# Frames 15-32 and 50-63 repeat the frame before them
+FREEZE_FILTER = ("[0]split[a][b];[a][b]freezeframes=first=15:last=32:replace=14,split[c][d];"
+                 "[c][d]freezeframes=first=50:last=63:replace=49")
+
+
+@pytest.fixture(scope="session")
+def freeze_clip(tmp_path_factory):
+    """
+    An 8 second, 10 fps lossless H.264 clip with two frozen stretches and a keyframe every
+    12 frames. Lossless, so the frozen frames decode to exact duplicates.
+    """
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("ffmpeg is not installed")
+    path = str(tmp_path_factory.mktemp("clips") / "freeze.mp4")
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=96x64:rate=10:duration=8",
+                    "-filter_complex", FREEZE_FILTER, "-c:v", "libx264", "-qp", "0", "-g", "12", "-pix_fmt", "yuv420p", path], check=True)
+    return path
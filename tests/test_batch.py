@@ -0,0 +1,60 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from fripper.batch import find_videos, is_up_to_date, run_batch
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    return str(path)
+
+
+def test_find_videos_skips_the_output_directory(tmp_path):
+    video = touch(tmp_path / "clips" / "a.mp4")
+    touch(tmp_path / "clips" / "out" / "a-1234abcd.mkv")
+    output_directory = str(tmp_path / "clips" / "out")
+
+    assert find_videos([str(tmp_path / "clips")], exclude=output_directory) == [video]
+    assert find_videos([str(tmp_path / "clips" / "**" / "*.m*")], exclude=output_directory) == [video]
+    # Without the exclusion an earlier run's output is picked up as input
+    assert len(find_videos([str(tmp_path / "clips")])) == 2
+
+
+@pytest.fixture
+def videos(tmp_path):
+    if shutil.which("ffmpeg") is None:
+        pytest.skip("ffmpeg is not installed")
+    directory = tmp_path / "videos"
+    directory.mkdir()
+    good = directory / "good.mp4"
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc=size=64x48:rate=10:duration=2", "-pix_fmt", "yuv420p", str(good)], check=True)
+    # Cut off before the moov atom, nothing can be decoded from it
+    (directory / "truncated.mp4").write_bytes(good.read_bytes()[:200])
+    return str(good), str(directory / "truncated.mp4")
+
+
+def test_batch_without_outputs_fails_and_is_retried(tmp_path, monkeypatch, videos):
+    good, truncated = videos
+    output_directory = str(tmp_path / "out")
+    options = {"timestamps": ["00:00:00.500"]}
+    manifest = run_batch("grab", [good, truncated], output_directory, workers=1, options=options)
+
+    assert manifest["videos"][good]["status"] == "ok"
+    assert not os.path.isabs(manifest["videos"][good]["outputs"][0])
+    assert manifest["videos"][truncated]["status"] == "failed"
+    assert manifest["summary"]["failed"] == 1
+
+    # From another directory the good video is still up to date, the failed one is tried again
+    monkeypatch.chdir(tmp_path / "videos")
+    manifest = run_batch("grab", [good, truncated], os.path.relpath(output_directory), workers=1, options=options)
+    assert manifest["summary"]["skipped"] == 1
+    assert manifest["summary"]["failed"] == 1
+
+
+def test_entry_without_outputs_is_never_up_to_date(tmp_path):
+    entry = {"status": "ok", "fingerprint": "f", "operation": "grab", "options": {}, "outputs": []}
+    assert not is_up_to_date(entry, "f", "grab", {}, str(tmp_path))
@@ -0,0 +1,76 @@
+import sys
+
+import pytest
+
+from fripper import __main__ as cli
+from fripper import splitter
+from fripper.__main__ import main
+
+
+class RecordingSplitter:
+    """Stands in for VideoSplitter, keeps the arguments instead of opening a window."""
+
+    instances = []
+
+    def __init__(self, video_path, **kwargs):
+        self.video_path = video_path
+        self.kwargs = kwargs
+        RecordingSplitter.instances.append(self)
+
+    def setup(self):
+        pass
+
+    def run(self):
+        pass
+
+
+@pytest.fixture
+def recorded_splitter(monkeypatch):
+    RecordingSplitter.instances = []
+    monkeypatch.setattr(splitter, "VideoSplitter", RecordingSplitter)
+    return RecordingSplitter.instances
+
+
+def run_cli(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["fripper", *argv])
+    main()
+
+
+@pytest.mark.parametrize("argv, scenes", [((), False), (("--scenes",), True)])
+def test_split_scenes_flag_reaches_splitter(monkeypatch, recorded_splitter, argv, scenes):
+    run_cli(monkeypatch, "split", "input.mp4", *argv)
+    assert recorded_splitter[0].kwargs["scenes"] is scenes
+
+
+@pytest.mark.parametrize("argv, function", [
+    (("--timestamp", "00:00:01.000", "00:00:02.000"), "grab_frames"),
+    (("--thumbnails",), "grab_thumbnails"),
+    (("--timestamp", "00:00:01.000"), "grab_frame"),
+])
+def test_grab_decoder_options_reach_every_mode(monkeypatch, argv, function):
+    calls = []
+    monkeypatch.setattr(cli, function, lambda *args, **kwargs: calls.append(kwargs))
+    run_cli(monkeypatch, "grab", "input.mp4", *argv, "--hwaccel", "vaapi", "--threads", "3", "--height", "240")
+    decoder = calls[0]["decoder"]
+    assert (decoder.hwaccel, decoder.threads, decoder.height) == ("vaapi", 3, 240)
+
+
+class RecordingJobs:
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+
+def test_frame_count_key_exports_every_region():
+    video_splitter = splitter.VideoSplitter("input.mp4")
+    video_splitter.jobs = RecordingJobs()
+    video_splitter.start_timestamp = "00:00:01.000"
+    video_splitter.regions = {"r1": [(0, 0), (10, 10)], "r2": [(10, 0), (20, 10)]}
+    video_splitter.export_frame_count()
+
+    name, args, kwargs = video_splitter.jobs.calls[0]
+    assert name == "submit_clip_regions"
+    assert args[1:] == ("00:00:01.000", "00:00:03.062", video_splitter.regions)
+    assert kwargs["decoder"] is video_splitter.export_decoder
@@ -0,0 +1,147 @@
+import sys
+
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+from fripper import deduper
+from fripper.deduper import (FastSSIM, batch_duplicate_flags, dedupe_video, filter_consecutive, get_duplicate_frames,
+                             get_duplicate_frames_batched, get_duplicate_frames_parallel, remove_duplicate_frames, seek_capture)
+
+
+def frame_pair():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    changed = frame.copy()
+    changed[30:34, 30:34] = 255 - changed[30:34, 30:34]
+    return frame, changed
+
+
+def test_ssim_threshold_defaults_to_the_ssim_default():
+    # Mean SSIM is about 0.9994, a duplicate at the SSIM default of 0.99 but not at the histogram one
+    frames = frame_pair()
+    assert batch_duplicate_flags(frames, method="ssim").tolist() == [True]
+    assert batch_duplicate_flags(frames, threshold=0.99999, method="ssim").tolist() == [False]
+
+
+def test_ssim_gate_can_be_turned_off():
+    # Only blue changes: gray SSIM is about 0.9997, the blue histogram correlation about 0.4
+    frame = np.random.default_rng(0).integers(0, 200, (64, 64, 3), dtype=np.uint8)
+    changed = frame.copy()
+    changed[..., 0] += 20
+    assert batch_duplicate_flags([frame, changed], method="ssim").tolist() == [False]
+    assert batch_duplicate_flags([frame, changed], method="ssim", ssim_gate=None).tolist() == [True]
+
+
+@pytest.mark.parametrize("gaussian", [False, True])
+def test_fast_ssim_matches_skimage(gaussian):
+    structural_similarity = pytest.importorskip("skimage.metrics").structural_similarity
+    gray1, gray2 = (cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) for frame in frame_pair())
+    if gaussian:
+        expected = structural_similarity(gray1, gray2, gaussian_weights=True, sigma=1.5, use_sample_covariance=False, data_range=255)
+    else:
+        expected = structural_similarity(gray1, gray2)
+    assert FastSSIM(gaussian=gaussian)(gray1, gray2) == pytest.approx(expected, abs=1e-6)
+
+
+def read_all(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+class OffByOneCapture:
+    """A capture whose seeks land one frame late, while reporting the requested position."""
+
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+
+    def set(self, prop, value):
+        self.cap.set(prop, value + 1)
+        self.requested = value
+        return True
+
+    def get(self, prop):
+        return self.requested if prop == cv2.CAP_PROP_POS_FRAMES else self.cap.get(prop)
+
+    def grab(self):
+        return self.cap.grab()
+
+    def release(self):
+        self.cap.release()
+
+
+@pytest.mark.parametrize("start", [1, 13, 40, 79])
+def test_seek_capture_lands_on_the_frame(freeze_clip, start):
+    expected = read_all(freeze_clip)[start]
+    for cap in (cv2.VideoCapture(freeze_clip), OffByOneCapture(freeze_clip)):
+        cap = seek_capture(cap, freeze_clip, start)
+        ok, frame = cap.read()
+        cap.release()
+        assert ok and np.array_equal(frame, expected)
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 256])
+def test_batched_detection_matches_the_per_pair_loop(freeze_clip, batch_size):
+    expected = get_duplicate_frames(freeze_clip)
+    assert expected  # The clip has frozen stretches to find
+    assert get_duplicate_frames_batched(freeze_clip, batch_size=batch_size) == expected
+
+
+@pytest.mark.parametrize("min_length", [1, 15])
+def test_single_pass_dedupe_matches_detect_then_remove(freeze_clip, tmp_path, min_length):
+    # With 15 only the first frozen stretch (18 duplicates) is long enough to remove
+    expected_path = str(tmp_path / "expected.mkv")
+    removed = filter_consecutive(get_duplicate_frames(freeze_clip), min_length=min_length)
+    remove_duplicate_frames(freeze_clip, removed, expected_path)
+
+    output_path = str(tmp_path / "single_pass.mkv")
+    written, removed_count = dedupe_video(freeze_clip, output_path, min_length=min_length, batch_size=7)
+    expected = read_all(expected_path)
+    assert (written, removed_count) == (len(expected), len(removed))
+    assert all(np.array_equal(a, b) for a, b in zip(read_all(output_path), expected, strict=True))
+
+
+@pytest.mark.parametrize("workers", [2, 4, 5])
+def test_parallel_detection_matches_serial(freeze_clip, workers):
+    # 80 frames: 4 workers split inside both frozen stretches (20, 60), 5 right around them (32, 48)
+    assert get_duplicate_frames_parallel(freeze_clip, workers=workers, batch_size=7) == get_duplicate_frames_batched(freeze_clip)
+
+
+def interrupt_after(count, iter_duplicate_flags):
+    def interrupted(*args, **kwargs):
+        for index, flag in enumerate(iter_duplicate_flags(*args, **kwargs)):
+            if index == count:
+                raise KeyboardInterrupt
+            yield flag
+    return interrupted
+
+
+def run_deduper(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["deduper", *argv])
+    deduper.main()
+
+
+def test_resumed_dedupe_matches_an_uninterrupted_run(freeze_clip, tmp_path, monkeypatch, capsys):
+    expected_path = str(tmp_path / "expected.mkv")
+    dedupe_video(freeze_clip, expected_path, min_length=5)
+
+    # Interrupted inside the first frozen stretch, between two checkpoints
+    output_path = str(tmp_path / "resumed.mkv")
+    argv = [freeze_clip, "--resumable", "--checkpoint", str(tmp_path / "checkpoint.json"), "--checkpoint-every", "10",
+            "--min-length", "5", "--batch-size", "7", "--output", output_path]
+    with monkeypatch.context() as patch:
+        patch.setattr(deduper, "iter_duplicate_flags", interrupt_after(23, deduper.iter_duplicate_flags))
+        with pytest.raises(KeyboardInterrupt):
+            run_deduper(monkeypatch, *argv)
+    run_deduper(monkeypatch, *argv)
+
+    assert "Resuming from frame 23" in capsys.readouterr().out
+    assert all(np.array_equal(a, b) for a, b in zip(read_all(output_path), read_all(expected_path), strict=True))
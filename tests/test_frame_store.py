@@ -0,0 +1,63 @@
+import os
+
+import numpy as np
+import pytest
+
+from fripper import frame_store
+from fripper.ffmpeg_cmd import file_fingerprint, stream_frames
+from fripper.frame_store import FrameStore, open_frame_store
+
+# Given explicitly so nothing needs ffprobe
+FPS = 10
+SIZE = (96, 64)
+
+
+@pytest.fixture
+def video(freeze_clip, tmp_path):
+    # A copy, the test changes its modification time
+    path = tmp_path / "video.mp4"
+    path.write_bytes(open(freeze_clip, "rb").read())
+    return str(path)
+
+
+def test_frame_store_round_trip(video, tmp_path):
+    path = str(tmp_path / "video.frames")
+    store = open_frame_store(video, path=path, fps=FPS, size=SIZE)
+
+    # stream_frames reuses its buffer, keep copies
+    frames = [frame.copy() for frame in stream_frames(video, fps=FPS, size=SIZE)]
+    assert len(store) == len(frames) == 80
+    assert store.shape == (SIZE[1], SIZE[0], 3)
+    assert store.fps == FPS
+    assert store.fingerprint == file_fingerprint(video)
+    assert all(np.array_equal(store[i], frame) for i, frame in enumerate(frames))
+    # No temporary file left next to the store
+    assert set(os.listdir(tmp_path)) == {"video.mp4", "video.frames"}
+
+
+def test_reopening_reads_the_store_without_decoding(video, tmp_path, monkeypatch):
+    path = str(tmp_path / "video.frames")
+    first = open_frame_store(video, path=path, fps=FPS, size=SIZE)
+
+    monkeypatch.setattr(frame_store, "build_frame_store", lambda *args, **kwargs: pytest.fail("store was rebuilt"))
+    reopened = open_frame_store(video, path=path, fps=FPS, size=SIZE)
+    assert len(reopened) == len(first)
+    assert np.array_equal(reopened[40], first[40])
+
+
+def test_store_is_stale_once_the_source_changes(video, tmp_path):
+    path = str(tmp_path / "video.frames")
+    open_frame_store(video, path=path, fps=FPS, size=SIZE)
+    stat = os.stat(video)
+    os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert open_frame_store(video, path=path, fps=FPS, size=SIZE, build=False) is None
+    rebuilt = open_frame_store(video, path=path, fps=FPS, size=SIZE)
+    assert rebuilt.fingerprint == file_fingerprint(video)
+
+
+def test_other_files_are_not_frame_stores(tmp_path):
+    path = tmp_path / "not.frames"
+    path.write_bytes(b"\0" * 8192)
+    with pytest.raises(ValueError, match="Not a frame store"):
+        FrameStore(str(path))
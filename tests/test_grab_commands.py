@@ -0,0 +1,49 @@
+import pytest
+
+from fripper.ffmpeg_cmd import DecoderOptions
+from fripper.ffmpeg_cmd import __main__ as ffmpeg_cmd
+from fripper.ffmpeg_cmd.__main__ import _frame_count_command, _grab_frames_seek_command, _grab_frames_select_command, _rip_frames_command
+
+DECODER = DecoderOptions("vaapi", threads=2, height=240)
+CROP = [(0, 0), (100, 50)]
+
+
+def test_seek_command_decodes_every_input_with_the_decoder():
+    command = _grab_frames_seek_command("in.mp4", [1.0, 20.0], ["a.jpg", "b.jpg"], CROP, DECODER)
+    assert command.count("-hwaccel") == 2
+    assert command.count("crop=100:50:0:0,scale=-2:240") == 2
+
+
+def test_select_command_scales_after_crop():
+    command = _grab_frames_select_command("in.mp4", [1.0, 2.0], "%d.jpg", CROP, DECODER)
+    assert command.index("-hwaccel") < command.index("-i")
+    assert command[command.index("-vf") + 1].endswith(",settb=1/1000,crop=100:50:0:0,scale=-2:240")
+
+
+def test_frame_count_command_uses_decoder():
+    command = _frame_count_command("in.mp4", "00:00:01.000", 2.0, "out.mp4", CROP, DECODER)
+    assert command.index("-hwaccel") < command.index("-i")
+    assert command[command.index("-vf") + 1] == "crop=100:50:0:0,scale=-2:240"
+
+
+def test_default_decoder_leaves_commands_unchanged():
+    command = _grab_frames_seek_command("in.mp4", [1.0], ["a.jpg"], None, DecoderOptions())
+    assert command == ["ffmpeg", "-y", "-ss", "1.000", "-i", "in.mp4", "-map", "0:v:0", "-frames:v", "1", "-q:v", "2", "a.jpg"]
+
+
+def test_rip_command_duration():
+    command = _rip_frames_command("in.mp4", "%05d.jpg", 4, "00:01:00.000", DecoderOptions(), 5)
+    assert command[:5] == ["ffmpeg", "-ss", "00:01:00.000", "-t", "5"]
+    assert "-t" not in _rip_frames_command("in.mp4", "%05d.jpg", 4, None, DecoderOptions())
+
+
+@pytest.mark.parametrize("method", ["select", "seek"])
+def test_grab_frames_names_frames_like_grab_frame(tmp_path, monkeypatch, method):
+    video = tmp_path / "in.mp4"
+    video.touch()
+    monkeypatch.setattr(ffmpeg_cmd, "_run_grab_command", lambda *args: False)
+    paths = ffmpeg_cmd.grab_frames(str(video), ["00:00:01.500", 62.25], str(tmp_path), method=method)
+    assert paths == [
+        ffmpeg_cmd._output_path(str(video), "00:00:01.500", str(tmp_path), ".jpg"),
+        ffmpeg_cmd._output_path(str(video), "00:01:02.250", str(tmp_path), ".jpg"),
+    ]
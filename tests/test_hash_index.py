@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from fripper.hash_index import MAX_CHUNK_RADIUS, NUM_CHUNKS, HashIndex
+
+
+def brute_force(hashes, value, max_distance):
+    # Plain Python popcounts, independent of the index and of phash.hamming_distance
+    return sorted(i for i, h in enumerate(hashes) if bin(int(h) ^ int(value)).count("1") <= max_distance)
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.choice(64, size=count, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+
+@pytest.fixture
+def index(tmp_path):
+    rng = np.random.default_rng(0)
+    video = tmp_path / "video.mp4"
+    video.touch()
+    hashes = [int(h) for h in rng.integers(0, 2 ** 64 - 1, size=2000, dtype=np.uint64, endpoint=True)]
+    # Near copies of the first hashes, so every query has neighbours at every distance
+    hashes += [flip_bits(hashes[i % 20], 1 + i % 16, rng) for i in range(400)]
+    index = HashIndex(str(tmp_path / "index"))
+    index.add(str(video), np.array(hashes, dtype=np.uint64), np.arange(len(hashes), dtype=np.float32))
+    return index, hashes
+
+
+@pytest.mark.parametrize("max_distance", range(0, (MAX_CHUNK_RADIUS + 1) * NUM_CHUNKS + 2))
+def test_search_matches_brute_force_scan(index, max_distance):
+    index, hashes = index
+    rng = np.random.default_rng(max_distance)
+    for query in [hashes[i] for i in range(20)] + [flip_bits(hashes[i], 3, rng) for i in range(20)]:
+        results = index.search(query, max_distance)
+        # The timestamps are the positions in `hashes`
+        assert sorted(int(timestamp) for _, timestamp, _ in results) == brute_force(hashes, query, max_distance)
+        assert [distance for _, _, distance in results] == sorted(distance for _, _, distance in results)
+
+
+def test_saved_index_gives_the_same_results(index, tmp_path):
+    index, hashes = index
+    index.save()
+    reopened = HashIndex(str(tmp_path / "index"))
+    assert len(reopened) == len(hashes)
+    for query in hashes[:20]:
+        assert reopened.search(query, 8) == index.search(query, 8)
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from fripper import lazy_frames
+from fripper.ffmpeg_cmd import stream_frames
+from fripper.lazy_frames import LazyFrames
+
+FPS = 10
+SIZE = (96, 64)
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    # The clip's size without ffprobe, and the start of every decode that is run
+    starts = []
+
+    def recording_stream_frames(*args, start=None, **kwargs):
+        starts.append(start)
+        return stream_frames(*args, start=start, **kwargs)
+
+    monkeypatch.setattr(lazy_frames, "get_video_dimensions", lambda video_path: SIZE)
+    monkeypatch.setattr(lazy_frames, "stream_frames", recording_stream_frames)
+    return starts
+
+
+def expected_frames(video):
+    return [frame.copy() for frame in stream_frames(video, fps=FPS, size=SIZE)]
+
+
+def test_fill_continues_from_the_position_after_a_jump(freeze_clip, tmp_path, decodes):
+    # Without the background thread, the fill is run by hand below
+    frames = LazyFrames(freeze_clip, str(tmp_path), fps=FPS, duration=8, fill_limit_mb=0)
+    frames[70]
+    frames._fill_worker()
+
+    # The window at 70, then the rest after it, then everything before it
+    assert decodes == ["00:00:07.000", "00:00:07.800", "00:00:00.000"]
+    assert frames.progress() == 1
+    assert all(np.array_equal(frames[i], frame) for i, frame in enumerate(expected_frames(freeze_clip)))
+    frames.close()
+
+
+def test_background_fill_decodes_every_frame(freeze_clip, tmp_path, decodes):
+    frames = LazyFrames(freeze_clip, str(tmp_path), fps=FPS, duration=8)
+    middle = frames[40]
+    frames.thread.join(timeout=30)
+    assert frames.progress() == 1
+    expected = expected_frames(freeze_clip)
+    assert np.array_equal(middle, expected[40])
+    assert all(np.array_equal(frames[i], frame) for i, frame in enumerate(expected))
+    frames.close()
@@ -0,0 +1,62 @@
+import os
+import stat
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from fripper.ffmpeg_cmd import stream_frames
+
+# Writes far more to stderr than a pipe buffer holds before sending two 2x2 frames
+FAKE_FFMPEG = """#!{python}
+import sys
+sys.stderr.write("warning: corrupt packet\\n" * 50000)
+sys.stderr.flush()
+sys.stdout.buffer.write(bytes(range(12)) * 2)
+sys.exit({returncode})
+"""
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    def install(returncode=0):
+        script = tmp_path / "ffmpeg"
+        script.write_text(FAKE_FFMPEG.format(python=sys.executable, returncode=returncode))
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        video = tmp_path / "video.mp4"
+        video.write_bytes(b"")
+        return str(video)
+    return install
+
+
+def collect(video_path):
+    result = {}
+
+    def run():
+        try:
+            result["frames"] = [frame.copy() for frame in stream_frames(video_path, fps=None, size=(2, 2))]
+        except Exception as e:
+            result["error"] = e
+
+    # A daemon thread, so a deadlock on the stderr pipe fails the test instead of hanging it
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "stream_frames hung"
+    if "error" in result:
+        raise result["error"]
+    return result["frames"]
+
+
+def test_noisy_stderr_does_not_block_frames(fake_ffmpeg):
+    frames = collect(fake_ffmpeg())
+    assert len(frames) == 2
+    assert frames[1].ravel().tolist() == list(range(12))
+
+
+def test_stderr_tail_is_reported_on_failure(fake_ffmpeg):
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        collect(fake_ffmpeg(returncode=1))
+    assert error.value.stderr.endswith(b"warning: corrupt packet\n")
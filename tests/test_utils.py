@@ -0,0 +1,18 @@
+import os
+
+import pytest
+
+from fripper.ffmpeg_cmd import atomic_write
+
+
+def test_atomic_write_keeps_the_old_file_when_interrupted(tmp_path):
+    path = str(tmp_path / "state.json")
+    with atomic_write(path) as f:
+        f.write("old")
+    with pytest.raises(KeyboardInterrupt):
+        with atomic_write(path) as f:
+            f.write("half")
+            raise KeyboardInterrupt
+    with open(path) as f:
+        assert f.read() == "old"
+    assert os.listdir(tmp_path) == ["state.json"]